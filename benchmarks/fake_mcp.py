@@ -0,0 +1,40 @@
+import sys
+import random
+import asyncio
+import argparse
+
+from mcp.server.fastmcp import FastMCP
+
+# A stand-in MCP backend: M tools named tool_0 .. tool_{M-1} that echo their input after
+# an injected latency, failing at the given rate. Started by benchmarks.run as a child
+# process so the server's CPU time does not count against the process being measured.
+
+def make_tool(index: int, latency: float, jitter: float, fail_rate: float, payload: int):
+    async def tool(text: str = "") -> str:
+        delay = latency + random.uniform(0, jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail_rate and random.random() < fail_rate:
+            raise RuntimeError(f"injected failure in tool_{index}")
+        return text + "x" * payload
+
+    return tool
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake MCP server for benchmarks.")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--transport", choices=["sse", "streamable-http"], default="sse")
+    parser.add_argument("--tools", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every tool call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds, uniform in [0, jitter]")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of tool calls that raise")
+    parser.add_argument("--payload", type=int, default=0, help="characters appended to every result")
+    args = parser.parse_args(argv)
+
+    server = FastMCP("benchmark", host="127.0.0.1", port=args.port, log_level="WARNING")
+    for i in range(args.tools):
+        server.add_tool(make_tool(i, args.latency, args.jitter, args.fail_rate, args.payload), name=f"tool_{i}", description=f"benchmark tool {i}")
+    server.run(transport=args.transport)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,82 @@
+import random
+import asyncio
+
+from maintainer.ai.model.nacos_mcp_info import (
+    McpEndpointInfo,
+    McpServerBasicInfo,
+    McpServerDetailInfo,
+    McpServerRemoteServiceConfig,
+    McpTool,
+    McpToolSpecification,
+)
+
+from endpoints import nacos_client
+
+# Backends per protocol: (host, port, export path).
+Backends = dict[str, tuple[str, int, str]]
+
+class FakeRegistry:
+    def __init__(self, backends: Backends, servers: int = 20, tools_per_server: int = 10, without_spec_every: int = 4,
+                 dead_endpoints: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+        # Every without_spec_every-th server is registered without a toolSpec, so discovery
+        # has to probe its backend; dead_endpoints adds that many unreachable replicas.
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.calls = {"list_mcp_servers": 0, "get_mcp_server_detail": 0}
+        self.details: dict[str, McpServerDetailInfo] = {}
+
+        protocols = sorted(backends)
+        for i in range(servers):
+            protocol = protocols[i % len(protocols)]
+            host, port, export_path = backends[protocol]
+            endpoints = [McpEndpointInfo(address=host, port=port)]
+            endpoints += [McpEndpointInfo(address="127.0.0.1", port=1 + d) for d in range(dead_endpoints)]
+            tool_spec = None
+            if not without_spec_every or i % without_spec_every:
+                tool_spec = McpToolSpecification(
+                    tools=[McpTool(name=f"tool_{t}", description=f"benchmark tool {t}", inputSchema={"type": "object", "properties": {"text": {"type": "string"}}}) for t in range(tools_per_server)],
+                    toolsMeta={},
+                )
+            name = f"server_{i}"
+            self.details[name] = McpServerDetailInfo(
+                name=name,
+                protocol=protocol,
+                version="1.0.0",
+                description=f"benchmark server {i}",
+                backendEndpoints=endpoints,
+                remoteServerConfig=McpServerRemoteServiceConfig(exportPath=export_path),
+                toolSpec=tool_spec,
+            )
+
+    async def _respond(self, operation: str):
+        self.calls[operation] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise RuntimeError(f"injected Nacos failure in {operation}")
+
+    async def list_mcp_servers(self, namespace_id: str, mcp_name: str, page_no: int, page_size: int):
+        await self._respond("list_mcp_servers")
+        names = sorted(self.details)
+        pages = max(1, -(-len(names) // page_size))
+        page = names[(page_no - 1) * page_size:page_no * page_size]
+        items = [McpServerBasicInfo(name=n, protocol=self.details[n].protocol, description=self.details[n].description, version=self.details[n].version) for n in page]
+        return len(names), page_no, pages, items
+
+    async def get_mcp_server_detail(self, namespace_id: str, mcp_name: str, version: str):
+        await self._respond("get_mcp_server_detail")
+        # A copy, because discovery filters the tool lists in place.
+        return self.details[mcp_name].model_copy(deep=True)
+
+class FakeMaintainerService:
+    registry: FakeRegistry = None
+
+    @classmethod
+    async def create_mcp_service(cls, ai_client_config):
+        return cls.registry
+
+def install(registry: FakeRegistry):
+    # Routes endpoints.nacos_client to the fake registry instead of a Nacos server.
+    FakeMaintainerService.registry = registry
+    nacos_client.NacosAIMaintainerService = FakeMaintainerService
+    nacos_client._mcp_services.clear()
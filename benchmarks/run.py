@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import itertools
+import subprocess
+from types import SimpleNamespace
+
+from werkzeug import Request
+from werkzeug.test import EnvironBuilder
+
+# Importing the endpoints imports dify_plugin, which monkey-patches the process with
+# gevent exactly as the plugin runtime does; concurrent requests are greenlets.
+from endpoints import invoker
+from endpoints.mcp_post import McpPostEndpoint
+from endpoints.messages import MessageEndpoint
+from endpoints.message_queue import stream_messages
+from endpoints.result_cache import result_cache
+from endpoints.event_loop import background_loop
+from endpoints import catalog_snapshot
+
+import gevent
+from gevent.pool import Pool
+
+from benchmarks.fake_nacos import FakeRegistry, install
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "baseline.json")
+RESULTS = os.path.join(HERE, "results", "latest.json")
+
+class MemoryStorage:
+    # Stands in for the plugin's session.storage.
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key: str, value: bytes):
+        self.data[key] = value
+
+    def get(self, key: str) -> bytes:
+        return self.data[key]
+
+    def delete(self, key: str):
+        self.data.pop(key, None)
+
+    def exist(self, key: str) -> bool:
+        return key in self.data
+
+class PostDriver:
+    name = "mcp_post"
+
+    def __init__(self):
+        self.storage = MemoryStorage()
+        self.endpoint = object.__new__(McpPostEndpoint)
+        self.endpoint.session = SimpleNamespace(storage=self.storage)
+
+    def request(self, message: dict) -> Request:
+        return Request(EnvironBuilder(method="POST", path="/mcp", json=message).get_environ())
+
+    def close(self):
+        pass
+
+class MessagesDriver:
+    name = "messages"
+
+    def __init__(self):
+        # One open SSE session whose queue is drained in the background, like a connected client.
+        self.storage = MemoryStorage()
+        self.endpoint = object.__new__(MessageEndpoint)
+        self.endpoint.session = SimpleNamespace(storage=self.storage)
+        self.session_id = "benchmark"
+        self.stream = stream_messages(self.storage, self.session_id, poll_interval=1, keepalive=60, idle_timeout=3600)
+        self.reader = gevent.spawn(lambda: [None for _ in self.stream])
+
+    def request(self, message: dict) -> Request:
+        return Request(EnvironBuilder(method="POST", path="/messages/", json=message, query_string={"session_id": self.session_id}).get_environ())
+
+    def close(self):
+        self.reader.kill()
+        self.stream.close()
+
+def percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def run_load(driver, next_message, settings: dict, concurrency: int, requests: int = 0, duration: float = 0.0, before_each=None) -> dict:
+    latencies = []
+    errors = 0
+
+    def one():
+        nonlocal errors
+        if before_each is not None:
+            before_each()
+        r = driver.request(next_message())
+        started = time.perf_counter()
+        response = driver.endpoint._invoke(r, {}, dict(settings))
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400 or b'"error":' in response.get_data():
+            errors += 1
+
+    pool = Pool(concurrency)
+    started = time.perf_counter()
+    if duration:
+        while time.perf_counter() - started < duration:
+            pool.spawn(one)
+    else:
+        for _ in range(requests):
+            pool.spawn(one)
+    pool.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def reset_caches(storage=None):
+    # Drops what a restarted process loses; given a storage, its catalog snapshot goes too.
+    if storage is not None:
+        for key in [key for key in storage.data if key.startswith("catalog:")]:
+            del storage.data[key]
+    catalog_snapshot._loaded.clear()
+    catalog_snapshot._snapshots.clear()
+    invoker._cache_mcp_tools.clear()
+    invoker._refresh_mcp_tools.clear()
+    result_cache._entries.clear()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_backend(transport: str, args) -> tuple[subprocess.Popen, int]:
+    port = free_port()
+    command = [sys.executable, "-m", "benchmarks.fake_mcp", "--port", str(port), "--transport", transport,
+               "--tools", str(args.tools), "--latency", str(args.mcp_latency), "--jitter", str(args.mcp_jitter),
+               "--fail-rate", str(args.mcp_fail_rate), "--payload", str(args.payload)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"fake MCP {transport} server did not start on port {port}")
+
+def make_settings(**parameter) -> dict:
+    return {"nacos_addr": "fake-nacos:8848", "nacos_namespace_id": "benchmark", "parameter": json.dumps(parameter)}
+
+def message_factories(args):
+    ids = itertools.count()
+    targets = itertools.cycle([(s, t) for t in range(args.tools) for s in range(args.servers)])
+
+    def tools_list():
+        return {"jsonrpc": "2.0", "id": next(ids), "method": "tools/list"}
+
+    def tools_call():
+        server, tool = next(targets)
+        return {"jsonrpc": "2.0", "id": next(ids), "method": "tools/call",
+                "params": {"name": f"server_{server}___tool_{tool}", "arguments": {"text": "ping"}}}
+
+    return {"tools/list": tools_list, "tools/call": tools_call}
+
+def run_benchmarks(args) -> dict:
+    results = {}
+    messages = message_factories(args)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    for driver in (PostDriver(), MessagesDriver()):
+        # Cold: every request finds neither a cached catalog nor a snapshot and runs a full discovery.
+        settings = make_settings(snapshot="storage")
+        for op, next_message in messages.items():
+            key = f"cold/{driver.name}/{op}/c1"
+            results[key] = run_load(driver, next_message, settings, 1, requests=args.cold_requests, before_each=lambda: reset_caches(driver.storage))
+            print_row(key, results[key])
+
+        # Restart: a fresh process that finds the catalog snapshot in storage.
+        for op, next_message in messages.items():
+            key = f"restart/{driver.name}/{op}/c1"
+            results[key] = run_load(driver, next_message, settings, 1, requests=args.cold_requests, before_each=reset_caches)
+            print_row(key, results[key])
+
+        # Warm: the catalog is cached for the whole run.
+        reset_caches(driver.storage)
+        driver.endpoint._invoke(driver.request(messages["tools/list"]()), {}, dict(settings))
+        for concurrency in levels:
+            for op, next_message in messages.items():
+                key = f"warm/{driver.name}/{op}/c{concurrency}"
+                results[key] = run_load(driver, next_message, settings, concurrency, requests=args.requests)
+                print_row(key, results[key])
+
+        # Expiry: the catalog expires several times during the run, refreshed in the
+        # foreground (the default) or in the background.
+        for mode, settings in (("expiry", make_settings(expire=args.expire)),
+                               ("expiry-background", make_settings(expire=args.expire, refresh="background"))):
+            reset_caches(driver.storage)
+            for concurrency in levels:
+                key = f"{mode}/{driver.name}/tools/call/c{concurrency}"
+                results[key] = run_load(driver, messages["tools/call"], settings, concurrency, duration=args.duration)
+                print_row(key, results[key])
+
+        driver.close()
+    return results
+
+def print_row(key: str, row: dict, baseline: dict = None):
+    line = f"{key:<48} {row['requests']:>6} req {row['errors']:>4} err {row['throughput']:>9.1f} req/s  p50 {row['p50_ms']:>8.2f} ms  p99 {row['p99_ms']:>8.2f} ms"
+    if baseline:
+        line += "  |  vs baseline: " + ", ".join(f"{field} {_change(row[field], baseline[field])}" for field in ("throughput", "p50_ms", "p99_ms"))
+    print(line, flush=True)
+
+def _change(value: float, base: float) -> str:
+    if not base:
+        return "n/a"
+    return f"{(value - base) / base * 100:+.0f}%"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the MCP POST and messages endpoints.")
+    parser.add_argument("--servers", type=int, default=20, help="MCP servers registered in the fake Nacos")
+    parser.add_argument("--tools", type=int, default=10, help="tools per MCP server")
+    parser.add_argument("--without-spec-every", type=int, default=4, help="every Nth server has no toolSpec and is probed (0: none)")
+    parser.add_argument("--dead-endpoints", type=int, default=0, help="unreachable replicas added to every server")
+    parser.add_argument("--nacos-latency", type=float, default=0.005, help="seconds per fake Nacos call")
+    parser.add_argument("--nacos-fail-rate", type=float, default=0.0)
+    parser.add_argument("--mcp-latency", type=float, default=0.005, help="seconds per fake tool call")
+    parser.add_argument("--mcp-jitter", type=float, default=0.0)
+    parser.add_argument("--mcp-fail-rate", type=float, default=0.0)
+    parser.add_argument("--payload", type=int, default=0, help="characters appended to every tool result")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per warm measurement")
+    parser.add_argument("--cold-requests", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per expiry measurement")
+    parser.add_argument("--expire", type=float, default=0.5, help="catalog expiry in the expiry scenarios")
+    parser.add_argument("--output", default=RESULTS)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    args = parser.parse_args(argv)
+
+    backends = []
+    try:
+        sse, sse_port = start_backend("sse", args)
+        backends.append(sse)
+        streamable, streamable_port = start_backend("streamable-http", args)
+        backends.append(streamable)
+
+        install(FakeRegistry(
+            {"mcp-sse": ("127.0.0.1", sse_port, "/sse"), "mcp-streamable": ("127.0.0.1", streamable_port, "/mcp")},
+            servers=args.servers, tools_per_server=args.tools, without_spec_every=args.without_spec_every,
+            dead_endpoints=args.dead_endpoints, latency=args.nacos_latency, fail_rate=args.nacos_fail_rate,
+        ))
+        results = run_benchmarks(args)
+    finally:
+        background_loop.shutdown()
+        for process in backends:
+            process.kill()
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline")},
+        "python": platform.python_version(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        print("\ncompared with", os.path.relpath(args.baseline))
+        for key, row in results.items():
+            print_row(key, row, baseline.get(key))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(HERE, "results", "startup.json")
+
+# Modules that only discovery and tool calls need; answering initialize should not load them.
+HEAVY_MODULES = ("mcp", "mcp.types", "maintainer.ai.nacos_mcp_service", "maintainer.ai.model.nacos_mcp_info", "aiohttp")
+ENDPOINT_MODULES = ("endpoints.mcp_post", "endpoints.messages", "endpoints.sse", "endpoints.mcp_get", "endpoints.metrics")
+
+def child(args):
+    # One fresh interpreter = one worker spawn: import the endpoints the way the plugin
+    # runtime does, then time the first initialize, tools/list and tools/call.
+    started = time.perf_counter()
+    import dify_plugin  # noqa: F401  (monkey-patches the process with gevent)
+    sdk_loaded = time.perf_counter()
+    for module in ENDPOINT_MODULES:
+        __import__(module)
+    endpoints_loaded = time.perf_counter()
+    heavy = [module for module in HEAVY_MODULES if module in sys.modules]
+
+    import gevent
+    from endpoints.event_loop import background_loop
+    from benchmarks.fake_nacos import FakeRegistry, install
+    from benchmarks.run import PostDriver, make_settings
+
+    install(FakeRegistry(
+        {"mcp-sse": ("127.0.0.1", args.sse_port, "/sse"), "mcp-streamable": ("127.0.0.1", args.streamable_port, "/mcp")},
+        servers=args.servers, tools_per_server=args.tools, without_spec_every=args.without_spec_every, latency=args.nacos_latency,
+    ))
+    driver = PostDriver()
+    settings = make_settings(warmup="on") if args.warmup else make_settings()
+
+    def timed_request(message: dict) -> float:
+        request = driver.request(message)
+        begin = time.perf_counter()
+        response = driver.endpoint._invoke(request, {}, dict(settings))
+        elapsed = time.perf_counter() - begin
+        if response.status_code >= 400 or b'"error":' in response.get_data():
+            raise RuntimeError(f"{message['method']} failed: {response.get_data()[:200]!r}")
+        return round(elapsed * 1000, 2)
+
+    result = {
+        "sdk_import_ms": round((sdk_loaded - started) * 1000, 2),
+        "endpoints_import_ms": round((endpoints_loaded - sdk_loaded) * 1000, 2),
+        "heavy_modules_at_import": heavy,
+        "initialize_ms": timed_request({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}}),
+    }
+    # A client sends notifications/initialized and then lists tools; think is the gap.
+    gevent.sleep(float(args.think))
+    result["first_tools_list_ms"] = timed_request({"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+    result["first_tools_call_ms"] = timed_request({"jsonrpc": "2.0", "id": 3, "method": "tools/call",
+                                                   "params": {"name": "server_0___tool_0", "arguments": {"text": "ping"}}})
+    background_loop.shutdown()
+    print(json.dumps(result), flush=True)
+
+def run_child(args, warmup: bool, think: float, sse_port: int, streamable_port: int) -> dict:
+    command = [sys.executable, "-m", "benchmarks.startup", "--child", "--sse-port", str(sse_port), "--streamable-port", str(streamable_port),
+               "--servers", str(args.servers), "--tools", str(args.tools), "--without-spec-every", str(args.without_spec_every),
+               "--nacos-latency", str(args.nacos_latency), "--think", str(think)]
+    if warmup:
+        command.append("--warmup")
+    output = subprocess.run(command, capture_output=True, text=True, timeout=120, cwd=os.path.dirname(HERE))
+    for line in reversed(output.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"startup child failed: {output.stderr[-2000:]}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time and first-request latency of a freshly spawned worker.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sse-port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--streamable-port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--servers", type=int, default=20)
+    parser.add_argument("--tools", type=int, default=10)
+    parser.add_argument("--without-spec-every", type=int, default=4)
+    parser.add_argument("--nacos-latency", type=float, default=0.005)
+    parser.add_argument("--mcp-latency", type=float, default=0.005)
+    parser.add_argument("--think", default="0.1,2", help="comma separated seconds between initialize and the first tools/list")
+    parser.add_argument("--output", default=RESULTS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    from benchmarks.run import start_backend
+
+    backend_args = argparse.Namespace(tools=args.tools, mcp_latency=args.mcp_latency, mcp_jitter=0.0, mcp_fail_rate=0.0, payload=0)
+    backends = []
+    results = {}
+    try:
+        sse, sse_port = start_backend("sse", backend_args)
+        backends.append(sse)
+        streamable, streamable_port = start_backend("streamable-http", backend_args)
+        backends.append(streamable)
+
+        # A short gap shows the cost a client pays when it lists tools right after
+        # initialize; warm-up only pays off once the gap covers the catalog load.
+        for think in [float(t) for t in args.think.split(",")]:
+            for mode, warmup in (("default", False), ("warmup", True)):
+                name = f"{mode}/think={think:g}s"
+                runs = [run_child(args, warmup, think, sse_port, streamable_port) for _ in range(args.runs)]
+                results[name] = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key.endswith("_ms")}
+                results[name]["heavy_modules_at_import"] = runs[0]["heavy_modules_at_import"]
+                print(f"{name:<20} " + "  ".join(f"{key[:-3]} {value:>8.1f} ms" for key, value in results[name].items() if key.endswith("_ms")), flush=True)
+        print(f"heavy modules loaded by the endpoint imports: {', '.join(next(iter(results.values()))['heavy_modules_at_import']) or 'none'}", flush=True)
+    finally:
+        for process in backends:
+            process.kill()
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"config": {key: value for key, value in vars(args).items() if key not in ("child", "warmup", "sse_port", "streamable_port", "output")},
+                   "python": sys.version.split()[0], "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+
+DEFAULT_CALL_CONCURRENCY = 48
+DEFAULT_BACKEND_CONCURRENCY = 16
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_QUEUE_TIMEOUT = 10
+DEFAULT_MAX_WAITING = 128
+# JSON-RPC implementation-defined server error answered when a call is shed.
+SERVER_BUSY = -32005
+
+class ServerBusyError(Exception):
+    pass
+
+class _Waiter:
+    __slots__ = ("server", "tool", "limits", "future")
+
+    def __init__(self, server: str, tool: str, limits: dict, future: asyncio.Future):
+        self.server = server
+        self.tool = tool
+        self.limits = limits
+        self.future = future
+
+class AdmissionController:
+    # Caps the tools/call requests running against the MCP backends: in total, per MCP
+    # server and per tool. Calls over a cap wait in a bounded queue, and are turned away
+    # at once when it is full. Lives on the shared loop thread, so nothing is locked.
+    def __init__(self):
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._servers: dict[str, int] = {}
+        self._tools: dict[str, int] = {}
+        # Waiters per server. A server moves to the back after each grant, so freed
+        # slots go round-robin across servers and a hot one cannot starve the rest.
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+
+    def _fits(self, server: str, tool: str, limits: dict) -> bool:
+        return (self.running < limits["call_concurrency"]
+                and self._servers.get(server, 0) < limits["backend_concurrency"]
+                and (not limits["tool_concurrency"] or self._tools.get(tool, 0) < limits["tool_concurrency"]))
+
+    def _take(self, server: str, tool: str):
+        self.running += 1
+        self._servers[server] = self._servers.get(server, 0) + 1
+        self._tools[tool] = self._tools.get(tool, 0) + 1
+
+    def release(self, server: str, tool: str):
+        self.running -= 1
+        for counts, key in ((self._servers, server), (self._tools, tool)):
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+        self._dispatch()
+
+    def _dispatch(self):
+        granted = True
+        while granted and self.waiting:
+            granted = False
+            for server in list(self._queues):
+                queue = self._queues[server]
+                served = False
+                for waiter in list(queue):
+                    if waiter.future.done():
+                        # Gave up waiting; its own cleanup may not have run yet.
+                        queue.remove(waiter)
+                        self.waiting -= 1
+                    elif self._fits(waiter.server, waiter.tool, waiter.limits):
+                        queue.remove(waiter)
+                        self.waiting -= 1
+                        self._take(waiter.server, waiter.tool)
+                        waiter.future.set_result(None)
+                        served = granted = True
+                        break
+                if not queue:
+                    del self._queues[server]
+                elif served:
+                    self._queues.move_to_end(server)
+
+    def _unqueue(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.server)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.waiting -= 1
+            if not queue:
+                del self._queues[waiter.server]
+
+    async def acquire(self, server: str, tool: str, limits: dict):
+        # Waiters are granted as soon as a slot frees, so capacity seen here is capacity
+        # none of them could use.
+        if self._fits(server, tool, limits):
+            self._take(server, tool)
+            return
+        if self.waiting >= limits["queue_size"]:
+            self.rejected += 1
+            raise ServerBusyError(f"{self.waiting} tool calls are already queued")
+
+        waiter = _Waiter(server, tool, limits, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(server, deque()).append(waiter)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(waiter.future, limits["queue_timeout"])
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the wait ended; hand the slot on.
+                self.release(server, tool)
+            else:
+                self._unqueue(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise ServerBusyError(f"no capacity for [{server}] within {limits['queue_timeout']}s") from None
+            raise
+
+    @contextlib.asynccontextmanager
+    async def slot(self, server: str, tool: str, limits: dict):
+        await self.acquire(server, tool, limits)
+        try:
+            yield
+        finally:
+            self.release(server, tool)
+
+admission = AdmissionController()
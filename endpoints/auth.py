@@ -11,7 +11,7 @@ def validate_bearer_token(r: Request, settings: Mapping) -> Optional[Response]:
             token = auth_header.removeprefix("Bearer ").strip()
 
         if settings.get("auth-token") != token:
-            req_id = r.json.get("id") if r.is_json else None
+            req_id = r.json.get("id") if r.is_json and isinstance(r.json, dict) else None
             error_response = {
                 "jsonrpc": "2.0",
                 "id": req_id,
@@ -0,0 +1,100 @@
+import time
+import random
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from maintainer.ai.model.nacos_mcp_info import McpEndpointInfo
+
+EWMA_ALPHA = 0.3
+DEFAULT_EJECT_AFTER = 3
+DEFAULT_EJECT_COOLOFF = 30
+
+class EndpointStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.ewma_latency = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def score(self) -> float:
+        # Endpoints without a latency sample yet score 0 so they get probed first.
+        return self.ewma_latency * (self.in_flight + 1)
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+_stats: dict[str, EndpointStats] = {}
+
+def endpoint_url(mcp_server_detail_info, endpoint: "McpEndpointInfo") -> str:
+    schema = "https" if endpoint.port == 443 else "http"
+    export_path = mcp_server_detail_info.remoteServerConfig.exportPath
+    return f"{schema}://{endpoint.address}:{endpoint.port}/{export_path.lstrip('/')}"
+
+def stats_for(url: str) -> EndpointStats:
+    stats = _stats.get(url)
+    if stats is None:
+        stats = _stats[url] = EndpointStats()
+    return stats
+
+class RandomPicker:
+    def pick(self, candidates: list[tuple[str, EndpointStats]]) -> tuple[str, EndpointStats]:
+        return random.choice(candidates)
+
+class PowerOfTwoPicker:
+    def pick(self, candidates: list[tuple[str, EndpointStats]]) -> tuple[str, EndpointStats]:
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        return a if a[1].score() <= b[1].score() else b
+
+PICKERS = {
+    "random": RandomPicker(),
+    "p2c": PowerOfTwoPicker(),
+}
+
+def pick_endpoint(mcp_server_detail_info, picker: str = "p2c", exclude: Optional[set] = None) -> Optional[str]:
+    urls = [endpoint_url(mcp_server_detail_info, endpoint) for endpoint in mcp_server_detail_info.backendEndpoints or []]
+    urls = [url for url in urls if not exclude or url not in exclude]
+    if not urls:
+        return None
+
+    now = time.monotonic()
+    candidates = [(url, stats_for(url)) for url in urls]
+    healthy = [c for c in candidates if not c[1].is_ejected(now)]
+    # When every endpoint is ejected, fall back to all of them rather than failing.
+    url, _ = PICKERS.get(picker, PICKERS["p2c"]).pick(healthy or candidates)
+    return url
+
+class EndpointTracker:
+    def __init__(self, url: str, eject_after: int = DEFAULT_EJECT_AFTER, eject_cooloff: float = DEFAULT_EJECT_COOLOFF, answered: tuple = ()):
+        self.stats = stats_for(url)
+        self.eject_after = eject_after
+        self.eject_cooloff = eject_cooloff
+        # Errors that prove the backend answered (e.g. a JSON-RPC error) do not count
+        # against its health.
+        self.answered = answered
+
+    def __enter__(self):
+        self.stats.in_flight += 1
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stats = self.stats
+        stats.in_flight -= 1
+        now = time.monotonic()
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            # Cut short by a deadline or a winning hedge: at least this slow, but not failed.
+            latency = now - self.started
+            if latency > stats.ewma_latency:
+                stats.ewma_latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * stats.ewma_latency
+        elif exc_type is None or issubclass(exc_type, self.answered):
+            latency = now - self.started
+            stats.ewma_latency = latency if stats.ewma_latency == 0 else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * stats.ewma_latency
+            stats.consecutive_failures = 0
+        else:
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.eject_after:
+                stats.ejected_until = now + self.eject_cooloff
+        return False
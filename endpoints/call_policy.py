@@ -0,0 +1,88 @@
+import time
+from collections import deque
+from typing import Mapping, Optional
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+# main.py caps every request at MAX_REQUEST_TIMEOUT=180 seconds; tool calls give up a
+# little earlier so the client still gets a JSON-RPC error rather than a dropped request.
+REQUEST_BUDGET = 170
+DEFAULT_HEDGE_DELAY = 1.0
+DEFAULT_HEDGE_QUANTILE = 0.95
+MIN_HEDGE_DELAY = 0.02
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+def _invoke_context(tools_meta, tool_name: str) -> Mapping:
+    meta = (tools_meta or {}).get(tool_name)
+    return getattr(meta, "invokeContext", None) or {}
+
+def _meta_seconds(invoke_context: Mapping, key: str, tool_name: str) -> Optional[float]:
+    # toolsMeta comes from the registry as is; a bad value is ignored, not fatal.
+    value = invoke_context.get(key)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        logger.warning(f"ignoring invalid invokeContext.{key}={value!r} of tool {tool_name}")
+        return None
+
+def call_timeout(options, tools_meta, full_name: str, tool_name: str) -> Optional[float]:
+    # Per tool through the call_timeouts map of the parameter setting or with
+    # invokeContext.timeout in the Nacos toolsMeta, else the call_timeout default;
+    # None leaves only the request budget.
+    if full_name in options.call_timeouts:
+        return options.call_timeouts[full_name]
+    timeout = _meta_seconds(_invoke_context(tools_meta, tool_name), "timeout", tool_name)
+    return timeout if timeout is not None else options.call_timeout
+
+def call_deadline(settings: Mapping, timeout: Optional[float]) -> float:
+    # The endpoint stamps "__deadline__" (time.monotonic) when the request arrives.
+    deadline = settings.get("__deadline__") or time.monotonic() + REQUEST_BUDGET
+    if timeout:
+        deadline = min(deadline, time.monotonic() + timeout)
+    return deadline
+
+def is_idempotent(options, tools_meta, full_name: str, tool_name: str) -> bool:
+    # Tools opt in through the idempotent_tools allowlist of the parameter setting or
+    # with invokeContext.idempotent in their Nacos toolsMeta.
+    if full_name in options.idempotent_tools:
+        return True
+    return bool(_invoke_context(tools_meta, tool_name).get("idempotent"))
+
+class LatencyWindow:
+    # Recent successful call latencies per tool, for the hedging delay. Lives on the
+    # shared loop thread like the telemetry counters.
+    def __init__(self):
+        self._samples: dict[str, deque] = {}
+
+    def record(self, key: str, seconds: float):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=LATENCY_WINDOW)
+        samples.append(seconds)
+
+    def quantile(self, key: str, q: float) -> Optional[float]:
+        samples = self._samples.get(key)
+        if samples is None or len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+latency_window = LatencyWindow()
+
+def hedge_delay(options, key: str) -> float:
+    # A fixed hedge_delay wins; otherwise the tool's p95 (hedge_quantile), or the default
+    # until enough calls have been seen.
+    if options.hedge_delay:
+        return options.hedge_delay
+    quantile = latency_window.quantile(key, options.hedge_quantile)
+    if quantile is None:
+        return DEFAULT_HEDGE_DELAY
+    return max(MIN_HEDGE_DELAY, quantile)
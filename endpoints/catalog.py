@@ -0,0 +1,150 @@
+import json
+import base64
+import bisect
+import hashlib
+import itertools
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from maintainer.ai.model.nacos_mcp_info import McpServerBasicInfo, McpServerDetailInfo, McpTool
+
+TOOL_NAME_SEPARATOR = "___"
+
+_generations = itertools.count(1)
+
+def server_marker(mcp_server: "McpServerBasicInfo") -> str:
+    # Digest of what the Nacos server list reports for a server (version, description,
+    # remote config, ...); a changed marker means its detail has to be fetched again.
+    from maintainer.ai.model.nacos_mcp_info import McpServerBasicInfo
+    basic = mcp_server.model_dump(mode="json", exclude_none=True, include=set(McpServerBasicInfo.model_fields))
+    return hashlib.sha1(json.dumps(basic, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+class ToolCatalog:
+    def __init__(self, mcp_server_list: list["McpServerDetailInfo"], errors: Optional[dict[str, str]] = None, markers: Optional[dict[str, str]] = None):
+        # Servers that were skipped or listed without tools, with the reason.
+        self.errors = errors or {}
+        # Change marker per server name, see server_marker.
+        self.markers = markers or {}
+        self.tools: dict[str, tuple["McpServerDetailInfo", "McpTool"]] = {}
+        self._servers: dict[str, "McpServerDetailInfo"] = {}
+        self._server_tools: dict[str, list[str]] = {}
+        # tools/list JSON per tool, so a change re-encodes only the servers it touches and
+        # pages are joined from it; _order is the stable (sorted) order pages follow.
+        self._tool_json: dict[str, bytes] = {}
+        self._search_text: dict[str, str] = {}
+        self._order: list[str] = []
+
+        for mcp_server in mcp_server_list:
+            self._add(mcp_server)
+        self._encode()
+
+    @property
+    def servers(self) -> list["McpServerDetailInfo"]:
+        return list(self._servers.values())
+
+    def _add(self, mcp_server: "McpServerDetailInfo"):
+        self._servers[mcp_server.name] = mcp_server
+        tools = getattr(getattr(mcp_server, "toolSpec", None), "tools", None)
+        if not tools:
+            return
+
+        names = []
+        for mcp_tool in tools:
+            name = mcp_server.name + TOOL_NAME_SEPARATOR + mcp_tool.name
+            description = mcp_server.description + ". " + mcp_tool.description
+            self.tools[name] = (mcp_server, mcp_tool)
+            names.append(name)
+            self._tool_json[name] = json.dumps({
+                "name": name,
+                "description": description,
+                "inputSchema": mcp_tool.inputSchema
+            }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._search_text[name] = (name + " " + description).lower()
+        self._server_tools[mcp_server.name] = names
+
+    def _remove(self, server_name: str):
+        self._servers.pop(server_name, None)
+        for name in self._server_tools.pop(server_name, []):
+            self.tools.pop(name, None)
+            self._tool_json.pop(name, None)
+            self._search_text.pop(name, None)
+
+    def _encode(self):
+        self.version = next(_generations)
+        self._order = sorted(self._tool_json)
+        self.tools_json = b"[" + b",".join(self._tool_json[name] for name in self._order) + b"]"
+        self.etag = hashlib.sha1(self.tools_json).hexdigest()
+
+    def apply(self, changed: dict[str, Optional["McpServerDetailInfo"]], errors: dict[str, str], markers: dict[str, str]) -> bool:
+        # Applies an incremental refresh in place: changed maps a server name to its new
+        # detail, or to None when the server is gone. Returns whether the tool list changed.
+        for server_name, mcp_server in changed.items():
+            self._remove(server_name)
+            if mcp_server is not None:
+                self._add(mcp_server)
+        self.errors = errors
+        self.markers = markers
+        etag = self.etag
+        if changed:
+            self._encode()
+        return self.etag != etag
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+    def resolve(self, name: str) -> Optional[tuple["McpServerDetailInfo", "McpTool"]]:
+        return self.tools.get(name)
+
+    def tools_list_response(self, req_id, cursor: Optional[str] = None, page_size: int = 0, prefix: Optional[str] = None, query: Optional[str] = None) -> bytes:
+        # tools/list is answered by splicing the request id into the pre-encoded tool list,
+        # or into a page of it. Raises ValueError for a cursor that cannot be decoded.
+        head = b'{"jsonrpc":"2.0","id":' + json.dumps(req_id).encode("utf-8") + b',"result":{"tools":'
+        if not cursor and not page_size and not prefix and not query:
+            return head + self.tools_json + b'}}'
+
+        after = None
+        if cursor:
+            # The filters travel in the cursor, since clients send only the cursor for later pages.
+            after, prefix, query = decode_cursor(cursor)
+        names, more = self.page(after, page_size, prefix, query)
+        body = head + b"[" + b",".join(self._tool_json[name] for name in names) + b"]"
+        if more:
+            body += b',"nextCursor":' + json.dumps(encode_cursor(names[-1], prefix, query)).encode("utf-8")
+        return body + b"}}"
+
+    def page(self, after: Optional[str], page_size: int, prefix: Optional[str] = None, query: Optional[str] = None) -> tuple[list[str], bool]:
+        # Keyset paging over the sorted names: a page continues after the last name of the
+        # previous one, so a catalog change between pages neither repeats nor skips tools
+        # that were there all along.
+        order = self._order
+        start = bisect.bisect_left(order, prefix) if prefix else 0
+        if after is not None:
+            start = max(start, bisect.bisect_right(order, after))
+        query = query.lower() if query else None
+
+        names = []
+        for i in range(start, len(order)):
+            name = order[i]
+            if prefix and not name.startswith(prefix):
+                break
+            if query and query not in self._search_text[name]:
+                continue
+            if page_size and len(names) == page_size:
+                return names, True
+            names.append(name)
+        return names, False
+
+def encode_cursor(after: str, prefix: Optional[str], query: Optional[str]) -> str:
+    state = {"after": after}
+    if prefix:
+        state["prefix"] = prefix
+    if query:
+        state["query"] = query
+    return base64.urlsafe_b64encode(json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[str, Optional[str], Optional[str]]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(state["after"]), state.get("prefix"), state.get("query")
+    except Exception:
+        raise ValueError(f"invalid cursor: {cursor}")
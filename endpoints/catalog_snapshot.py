@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+from typing import Optional
+
+from .catalog import ToolCatalog
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+SNAPSHOT_FORMAT = 1
+CHUNK_SIZE = 256 * 1024
+# The manifest grants 1 MB of plugin storage, shared with the SSE message queues, which
+# need room for every pending /messages response; the snapshot takes a quarter at most.
+MAX_SNAPSHOT_BYTES = 256 * 1024
+DEFAULT_SNAPSHOT_MAX_AGE = 86400
+DEFAULT_SNAPSHOT_INTERVAL = 300
+
+# Per catalog key: the etag and timestamp of the snapshot last read or written by this
+# process, so unchanged catalogs are not rewritten on every refresh.
+_snapshots: dict[str, tuple[str, float]] = {}
+_loaded: set[str] = set()
+
+class FileStore:
+    # Same interface as the plugin storage, backed by files in one directory.
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", key))
+
+    def set(self, key: str, value: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        with open(path + ".tmp", "wb") as f:
+            f.write(value)
+        os.replace(path + ".tmp", path)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def exist(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+def snapshot_store(options, storage):
+    if options.snapshot == "file":
+        return FileStore(options.snapshot_dir or os.path.join(tempfile.gettempdir(), "nacos_mcp_discovery_for_dify"))
+    if options.snapshot == "storage":
+        return storage
+    return None
+
+def encode_snapshot(catalog: ToolCatalog) -> bytes:
+    # Depends on the catalog only, so an unchanged catalog encodes to the same generation.
+    document = {
+        "format": SNAPSHOT_FORMAT,
+        "servers": [server.model_dump(mode="json", exclude_none=True, by_alias=True) for server in catalog.servers],
+        "errors": catalog.errors,
+    }
+    return zlib.compress(json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+def decode_snapshot(blob: bytes) -> ToolCatalog:
+    from maintainer.ai.model.nacos_mcp_info import McpServerDetailInfo
+    document = json.loads(zlib.decompress(blob))
+    if document.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"unsupported catalog snapshot format {document.get('format')}")
+    servers = [McpServerDetailInfo.model_validate(server) for server in document["servers"]]
+    return ToolCatalog(servers, document.get("errors"))
+
+def _meta_key(catalog_key: str) -> str:
+    return f"catalog:{catalog_key}:meta"
+
+def _chunk_key(catalog_key: str, generation: str, index: int) -> str:
+    return f"catalog:{catalog_key}:{generation}:{index}"
+
+def load_snapshot(store, catalog_key: str) -> Optional[tuple[ToolCatalog, float]]:
+    if not store.exist(_meta_key(catalog_key)):
+        return None
+    meta = json.loads(store.get(_meta_key(catalog_key)))
+    blob = b"".join(store.get(_chunk_key(catalog_key, meta["generation"], i)) for i in range(meta["chunks"]))
+    # A writer in another process may have replaced the chunks under us.
+    if hashlib.sha1(blob).hexdigest() != meta["generation"]:
+        raise ValueError("catalog snapshot changed while it was read")
+    catalog = decode_snapshot(blob)
+    _snapshots[catalog_key] = (catalog.etag, meta["timestamp"])
+    return catalog, meta["timestamp"]
+
+def save_snapshot(store, catalog_key: str, blob: bytes, timestamp: float) -> bool:
+    # Local files are not subject to the plugin storage quota.
+    if not isinstance(store, FileStore) and len(blob) > MAX_SNAPSHOT_BYTES:
+        logger.warning(f"catalog snapshot for key {catalog_key} is {len(blob)} bytes compressed, over the {MAX_SNAPSHOT_BYTES} byte budget; not stored")
+        return False
+
+    # Chunks are written under a new generation before the meta record points at them,
+    # so readers see either the old or the new snapshot, never a mix.
+    generation = hashlib.sha1(blob).hexdigest()
+    chunks = [blob[i:i + CHUNK_SIZE] for i in range(0, len(blob), CHUNK_SIZE)]
+    previous = json.loads(store.get(_meta_key(catalog_key))) if store.exist(_meta_key(catalog_key)) else None
+    if not previous or previous["generation"] != generation:
+        for i, chunk in enumerate(chunks):
+            store.set(_chunk_key(catalog_key, generation, i), chunk)
+    store.set(_meta_key(catalog_key), json.dumps({"generation": generation, "chunks": len(chunks), "timestamp": timestamp}).encode())
+    if previous and previous["generation"] != generation:
+        for i in range(previous["chunks"]):
+            store.delete(_chunk_key(catalog_key, previous["generation"], i))
+    return True
+
+def restore_catalog(store, catalog_key: str, cache: dict, max_age: float):
+    # Seeds the in-process catalog cache from the shared snapshot, once per process.
+    if catalog_key in _loaded or catalog_key in cache:
+        return
+    _loaded.add(catalog_key)
+    try:
+        loaded = load_snapshot(store, catalog_key)
+    except Exception as e:
+        logger.warning(f"catalog snapshot for key {catalog_key} could not be loaded: {e}")
+        return
+    if loaded is None:
+        return
+    catalog, timestamp = loaded
+    if time.time() - timestamp < max_age:
+        cache.setdefault(catalog_key, {"data": catalog, "timestamp": timestamp, "snapshot": True})
+
+def persist_catalog(store, catalog_key: str, cache: dict, interval: float):
+    # Writes the cached catalog back when it changed, or when the stored copy is older
+    # than interval so other processes do not start from an aged snapshot. The refresh
+    # encoded it already (see invoker._refresh_mcp_tools_task); only storage I/O is left.
+    cached = cache.get(catalog_key)
+    if cached is None or cached.get("snapshot") or cached.get("encoded") is None:
+        return
+    etag, timestamp = _snapshots.get(catalog_key, (None, 0))
+    if cached["data"].etag == etag and cached["timestamp"] - timestamp < interval:
+        return
+    # Recorded up front so a snapshot that cannot be stored is not re-encoded per request.
+    _snapshots[catalog_key] = (cached["data"].etag, cached["timestamp"])
+    try:
+        save_snapshot(store, catalog_key, cached["encoded"], cached["timestamp"])
+    except Exception as e:
+        logger.warning(f"catalog snapshot for key {catalog_key} could not be stored: {e}")
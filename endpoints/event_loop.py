@@ -0,0 +1,197 @@
+import atexit
+import asyncio
+import selectors
+import threading
+import _thread
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from .admission import ServerBusyError
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+DEFAULT_MAX_CONCURRENCY = 64
+SHUTDOWN_TIMEOUT = 5
+
+def _native(module: str, name: str, default):
+    # dify_plugin monkey-patches the process with gevent, so threading.Thread and the
+    # default selector are greenlet based; the shared loop needs a real OS thread.
+    try:
+        from gevent import monkey
+        return monkey.get_original(module, name)
+    except ImportError:
+        return default
+
+def _gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched("threading")
+    except ImportError:
+        return False
+
+_start_new_thread = _native("_thread", "start_new_thread", _thread.start_new_thread)
+_DefaultSelector = _native("selectors", "DefaultSelector", selectors.DefaultSelector)
+_allocate_lock = _native("_thread", "allocate_lock", _thread.allocate_lock)
+
+class _NativeThreadExecutor(ThreadPoolExecutor):
+    # Used as the loop's default executor (getaddrinfo etc.), one native thread per job.
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        _start_new_thread(run, ())
+        return future
+
+class BackgroundLoop:
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        self.waiting = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        # waiting is updated from request greenlets and the loop thread alike.
+        self._waiting_lock = _allocate_lock()
+        self._slots: Optional[asyncio.Condition] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.SelectorEventLoop(_DefaultSelector())
+                loop.set_default_executor(_NativeThreadExecutor())
+                self._slots = None
+                self.running = 0
+                self.waiting = 0
+                _start_new_thread(self._run, (loop,))
+                self._loop = loop
+            return self._loop
+
+    def _run(self, loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def is_current(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def _limited(self, coro, max_concurrency: int, done_waiting):
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+        # waiting was counted by submit, on the caller's thread.
+        try:
+            async with self._slots:
+                await self._slots.wait_for(lambda: self.running < max(1, max_concurrency))
+                self.running += 1
+        finally:
+            done_waiting()
+        try:
+            return await coro
+        finally:
+            async with self._slots:
+                self.running -= 1
+                self._slots.notify()
+
+    def submit(self, coro_func, *args, max_concurrency: Optional[int] = None, max_waiting: Optional[int] = None, **kwargs) -> Future:
+        # With max_waiting, a request that would queue behind that many others is refused
+        # right away instead of waiting for a slot it may never get in time.
+        loop = self.loop
+        with self._waiting_lock:
+            if max_waiting is not None and self.waiting >= max_waiting:
+                raise ServerBusyError(f"{self.waiting} requests are already waiting")
+            self.waiting += 1
+        counted = [True]
+
+        def done_waiting():
+            # Once per submission: from _limited, or from the future when it was
+            # cancelled before _limited ever ran.
+            with self._waiting_lock:
+                if counted[0]:
+                    counted[0] = False
+                    self.waiting -= 1
+
+        def cancelled_early(future: Future):
+            if counted[0]:
+                # Never started: its coroutine is dropped unawaited.
+                coro.close()
+            done_waiting()
+
+        try:
+            coro = coro_func(*args, **kwargs)
+            future = asyncio.run_coroutine_threadsafe(self._limited(coro, max_concurrency or self.max_concurrency, done_waiting), loop)
+        except BaseException:
+            done_waiting()
+            raise
+        future.add_done_callback(cancelled_early)
+        return future
+
+    def run(self, coro_func, *args, max_concurrency: Optional[int] = None, max_waiting: Optional[int] = None, **kwargs):
+        return wait_future(self.submit(coro_func, *args, max_concurrency=max_concurrency, max_waiting=max_waiting, **kwargs))
+
+    async def run_here(self, coro):
+        # Awaits coro on the shared loop from whatever loop the caller is running on.
+        if self.is_current():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
+
+        async def _drain():
+            from .session_pool import session_pool
+            await session_pool.close_sessions()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        try:
+            wait_future(asyncio.run_coroutine_threadsafe(_drain(), loop), timeout)
+        except Exception as e:
+            logger.warning(f"background loop shutdown: {e}")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+def wait_future(future: Future, timeout: Optional[float] = None):
+    # Under gevent a blocking Future.result() would stall the hub; park the greenlet
+    # on an async watcher instead, which the loop's native thread may wake.
+    if not _gevent_patched():
+        return future.result(timeout)
+
+    from gevent import get_hub, Timeout
+    from gevent.hub import Waiter
+    hub = get_hub()
+    watcher = hub.loop.async_()
+    waiter = Waiter()
+    watcher.start(waiter.switch, None)
+    try:
+        future.add_done_callback(lambda _: watcher.send())
+        with Timeout(timeout, TimeoutError(f"background task did not finish within {timeout}s")):
+            waiter.get()
+    finally:
+        watcher.close()
+    return future.result()
+
+background_loop = BackgroundLoop()
+
+atexit.register(background_loop.shutdown)
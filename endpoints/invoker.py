@@ -1,29 +1,26 @@
 import json
-import re
-import random
-import hashlib
-import uuid
 import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 
-from typing import Mapping, cast, Any
-from pydantic import BaseModel
-from werkzeug import Request, Response
+from typing import TYPE_CHECKING, Mapping, Iterator, Optional
 
-from maintainer.ai.model.nacos_mcp_info import *
-from maintainer.ai.nacos_mcp_service import NacosAIMaintainerService
-from maintainer.common.ai_maintainer_client_config_builder import AIMaintainerClientConfigBuilder
-from maintainer.ai.model.nacos_mcp_info import McpServerDetailInfo, McpToolSpecification, McpTool, McpToolMeta
+from .session_pool import session_pool, SessionConnectError
+from .balancer import pick_endpoint, EndpointTracker
+from .event_loop import background_loop, wait_future
+from .catalog import ToolCatalog, server_marker
+from .result_cache import result_cache, cache_key, cache_ttl
+from .nacos_client import get_mcp_service, list_mcp_server_pages
+from .message_queue import KEEPALIVE, DEFAULT_KEEPALIVE
+from .plugin_settings import load_settings
+from .telemetry import timed, count_catalog_cache
+from .catalog_snapshot import snapshot_store, restore_catalog, persist_catalog, encode_snapshot
+from .call_policy import call_timeout, call_deadline, is_idempotent, hedge_delay, latency_window
+from .admission import admission, ServerBusyError, SERVER_BUSY
 
-from dify_plugin import Endpoint
-from dify_plugin.entities import I18nObject
-from dify_plugin.entities.tool import ToolParameter, ToolProviderType, ToolInvokeMessage, ToolDescription
-from dify_plugin.interfaces.agent import ToolEntity, AgentToolIdentity
-
-from mcp import ClientSession, types
-from mcp.client.sse import sse_client
-from mcp.client.streamable_http import streamablehttp_client
+# mcp and the Nacos maintainer SDK are imported where first used, so loading the
+# endpoints (and answering initialize) does not pay for them.
+if TYPE_CHECKING:
+    from maintainer.ai.model.nacos_mcp_info import McpServerDetailInfo, McpToolSpecification
 
 import logging
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -33,48 +30,206 @@ logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
             
 def is_debug(settings: Mapping) -> bool:    
-    if "parameter" not in settings or not settings["parameter"]:
-        return False
-        
-    parameter = json.loads(settings.get("parameter"))
-    return bool(parameter.get("debug") == "debug")
+    return load_settings(settings).debug
+
+def encode_response(response: dict | bytes) -> bytes:
+    if isinstance(response, bytes):
+        return response
+    return json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def encode_responses(responses: list, is_batch: bool) -> bytes:
+    if not is_batch:
+        return encode_response(responses[0])
+    return b"[" + b",".join(encode_response(response) for response in responses) + b"]"
+
+def busy_response(message_id, error: ServerBusyError) -> dict:
+    return {"jsonrpc": "2.0", "id": message_id, "error": {"code": SERVER_BUSY, "message": f"Server busy: {error}"}}
+
+def unpack_messages(payload) -> tuple[list, bool]:
+    if isinstance(payload, list):
+        # An empty batch is answered with a single error object, not an array.
+        return payload, bool(payload)
+    return [payload], False
+
+def invoke_messages(messages: list, values: Mapping, settings: Mapping, handle_local, storage=None) -> list:
+    # Answers every JSON-RPC message in request order. tools/* messages go to the
+    # shared loop in one submission and run concurrently; the rest, and notifications,
+    # are answered by handle_local (None means no response).
+    if not messages:
+        return [{"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request: empty batch"}}]
+    
+    responses = [None] * len(messages)
+    tool_messages = []
+    for i, message in enumerate(messages):
+        if not isinstance(message, dict):
+            responses[i] = {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}}
+        elif message.get("method") in ("tools/list", "tools/call"):
+            tool_messages.append(i)
+        else:
+            responses[i] = handle_local(message)
+    
+    if tool_messages:
+        # The catalog snapshot is read and written here, on the request's greenlet,
+        # because the plugin storage cannot be used from the shared loop's thread.
+        options = load_settings(settings)
+        store = snapshot_store(options, storage)
+        if store is not None:
+            restore_catalog(store, options.catalog_key, _cache_mcp_tools, options.snapshot_max_age)
+        try:
+            results = background_loop.run(_invoke_many, [messages[i] for i in tool_messages], values, settings,
+                                          max_concurrency=options.max_concurrency, max_waiting=options.max_waiting)
+        except ServerBusyError as e:
+            logger.warning(f"shedding {len(tool_messages)} tools requests: {e}")
+            results = [busy_response(messages[i].get("id"), e) for i in tool_messages]
+        for i, result in zip(tool_messages, results):
+            responses[i] = result if "id" in messages[i] else None
+        if store is not None:
+            persist_catalog(store, options.catalog_key, _cache_mcp_tools, options.snapshot_interval)
+    return responses
+
+def stream_message(message: Mapping, values: Mapping, settings: Mapping, keepalive: float = DEFAULT_KEEPALIVE, storage=None) -> Iterator:
+    # Runs one tools/call on the shared loop and yields the upstream progress notifications
+    # as they arrive (KEEPALIVE while nothing happens), then the response itself.
+    events = asyncio.Queue()
+    progress_token = (message.get("params", {}).get("_meta") or {}).get("progressToken")
+    
+    async def forward_progress(progress: float, total: float | None, text: str | None):
+        params = {"progressToken": progress_token, "progress": progress}
+        if total is not None:
+            params["total"] = total
+        if text:
+            params["message"] = text
+        events.put_nowait({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+    
+    async def run():
+        try:
+            response = await _invoke0(message, values, settings, progress_callback=forward_progress if progress_token is not None else None)
+        except Exception as e:
+            logger.error(f"streamed {message.get('method')} failed: {e}", exc_info=True)
+            response = {"jsonrpc": "2.0", "id": message.get("id"), "error": {"code": -32603, "message": f"Internal error: {e}"}}
+        events.put_nowait(_Done(response))
+    
+    async def next_event():
+        try:
+            return await asyncio.wait_for(events.get(), timeout=keepalive)
+        except asyncio.TimeoutError:
+            return KEEPALIVE
+    
+    options = load_settings(settings)
+    store = snapshot_store(options, storage)
+    if store is not None:
+        restore_catalog(store, options.catalog_key, _cache_mcp_tools, options.snapshot_max_age)
+    try:
+        future = background_loop.submit(run, max_concurrency=options.max_concurrency, max_waiting=options.max_waiting)
+    except ServerBusyError as e:
+        logger.warning(f"shedding streamed {message.get('method')}: {e}")
+        yield busy_response(message.get("id"), e)
+        return
+    try:
+        while True:
+            event = wait_future(asyncio.run_coroutine_threadsafe(next_event(), background_loop.loop))
+            if isinstance(event, _Done):
+                if store is not None:
+                    persist_catalog(store, options.catalog_key, _cache_mcp_tools, options.snapshot_interval)
+                yield event.response
+                return
+            yield event
+    finally:
+        # The client went away before the result; stop waiting for it upstream.
+        future.cancel()
+
+class _Done:
+    def __init__(self, response):
+        self.response = response
+
+def get_catalog_etag(settings: Mapping) -> str | None:
+    # Etag of the catalog already cached for these settings, None before the first load.
+    # Never revalidates: idle listeners must not drive catalog refreshes.
+    cached = _cache_mcp_tools.get(load_settings(settings).catalog_key)
+    return cached["data"].etag if cached is not None else None
+
+async def _invoke_many(messages: list, values: Mapping, settings: Mapping) -> list:
+    if len(messages) == 1:
+        return [await _invoke0(messages[0], values, settings)]
+    
+    fan_out = asyncio.Semaphore(load_settings(settings).batch_fan_out)
+    
+    async def invoke_one(message):
+        async with fan_out:
+            try:
+                return await _invoke0(message, values, settings)
+            except Exception as e:
+                logger.error(f"batch entry {message.get('method')} failed: {e}", exc_info=True)
+                return {"jsonrpc": "2.0", "id": message.get("id"), "error": {"code": -32603, "message": f"Internal error: {e}"}}
+    
+    return await asyncio.gather(*[invoke_one(message) for message in messages])
 
-async def _invoke0(r: Request, values: Mapping, settings: Mapping) -> dict:    
+async def _invoke0(message: Mapping, values: Mapping, settings: Mapping, progress_callback=None) -> dict | bytes:
     if is_debug(settings):
         logger.info(f"start list_mcp_tools")
-    mcp_server_list = await list_mcp_tools(settings)
+    catalog = await list_mcp_tools(settings)
     if is_debug(settings):
         logger.info(f"end   list_mcp_tools")
     
-    if r.json.get("method") == "tools/list":
-        mcp_tools = []
-        for mcp_server in mcp_server_list:
-            tools = getattr(getattr(mcp_server, "toolSpec", None), "tools", None)
-            if not tools:
-                continue
-                
-            for mcp_tool in tools:
-                mcp_tools.append({
-                    "name": mcp_server.name + "___" + mcp_tool.name,
-                    "description": mcp_server.description + ". " + mcp_tool.description,
-                    "inputSchema": mcp_tool.inputSchema
-                })
-        return {
-            "jsonrpc": "2.0",
-            "id": r.json.get("id"),
-            "result": {
-                "tools": mcp_tools
+    if message.get("method") == "tools/list":
+        # cursor is MCP pagination; prefix and query are extensions narrowing the list
+        # to names starting with prefix or names/descriptions containing query.
+        params = message.get("params") or {}
+        try:
+            return catalog.tools_list_response(message.get("id"), cursor=params.get("cursor"), page_size=load_settings(settings).tools_page_size,
+                                               prefix=params.get("prefix"), query=params.get("query"))
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": message.get("id"), "error": {"code": -32602, "message": str(e)}}
+    elif message.get("method") == "tools/call":
+        name = message.get("params", {}).get("name") or ""
+        arguments = message.get("params", {}).get("arguments", {})
+        resolved = catalog.resolve(name)
+        if resolved is None:
+            return {
+                "jsonrpc": "2.0",
+                "id": message.get("id"),
+                "error": {"code": -32602, "message": f"Unknown tool: {name}"},
             }
-        }
-    elif r.json.get("method") == "tools/call":
-        mcp_name  = r.json.get("params", {}).get("name").split("___")[0]
-        tool_name = r.json.get("params", {}).get("name").split("___")[1]
-        arguments = r.json.get("params", {}).get("arguments", {})
-        mcp_server_detail_info = next((tool for tool in mcp_server_list if tool.name == mcp_name), None)
+        mcp_server_detail_info, mcp_tool = resolved
+        tool_name = mcp_tool.name
+        
+        options = load_settings(settings)
+        tools_meta = getattr(mcp_server_detail_info.toolSpec, "toolsMeta", None)
+        ttl = cache_ttl(options, tools_meta, name, tool_name)
+        deadline = call_deadline(settings, call_timeout(options, tools_meta, name, tool_name))
+        hedge = options.hedge and is_idempotent(options, tools_meta, name, tool_name)
+        
+        async def admitted_call():
+            # Cached answers skip admission; only calls that reach a backend take a slot.
+            async with admission.slot(mcp_server_detail_info.name, name, options.admission_options):
+                return await call_mcp_tools(mcp_server_detail_info, tool_name, arguments, settings, progress_callback, hedge=hedge)
         
         if is_debug(settings):
             logger.info(f"start call_mcp_tools")
-        call_result = await call_mcp_tools(mcp_server_detail_info, tool_name, arguments, settings)
+        try:
+            # The deadline covers waiting for an identical cached call or an admission
+            # slot, session setup and the call itself.
+            async with asyncio.timeout(max(0.0, deadline - time.monotonic())):
+                if ttl > 0:
+                    result_cache.max_entries = options.cache_max_entries
+                    scope = f"{options.nacos_addr}|{options.nacos_namespace_id}"
+                    call_result = await result_cache.get_or_call(
+                        cache_key(scope, mcp_server_detail_info.name, tool_name, arguments), ttl,
+                        admitted_call,
+                        cacheable=lambda result: result is not None and not getattr(result, "isError", False),
+                    )
+                else:
+                    call_result = await admitted_call()
+        except ServerBusyError as e:
+            logger.warning(f"tools/call [{name}] shed: {e}")
+            return busy_response(message.get("id"), e)
+        except TimeoutError:
+            logger.warning(f"tools/call [{name}] did not finish before its deadline")
+            return {
+                "jsonrpc": "2.0",
+                "id": message.get("id"),
+                "error": {"code": -32001, "message": f"Request timed out: {name}"},
+            }
         if is_debug(settings):
             logger.info(f"end   call_mcp_tools type is {type(call_result).__name__}")
             
@@ -86,7 +241,7 @@ async def _invoke0(r: Request, values: Mapping, settings: Mapping) -> dict:
         
         return {
             "jsonrpc": "2.0",
-            "id": r.json.get("id"),
+            "id": message.get("id"),
             "result": {
                 "content": content,
                 "isError": False
@@ -96,67 +251,136 @@ async def _invoke0(r: Request, values: Mapping, settings: Mapping) -> dict:
     return {}
 
 _cache_mcp_tools = {}
-_cache_mcp_tools_lock = asyncio.Lock()
+_refresh_mcp_tools = {}
 
 async def list_mcp_tools(settings: Mapping):
-    nacos_addr = settings.get("nacos_addr") or "127.0.0.1:8848"
-    nacos_namespace_id = settings.get("nacos_namespace_id") or "public"
-    mcp_name_pattern = settings.get("mcp_name_pattern") or ""
-    tool_name_pattern = settings.get("tool_name_pattern") or ""
-    
-    combined = f"{nacos_addr}|{nacos_namespace_id}|{mcp_name_pattern}|{tool_name_pattern}"
-    combined = hashlib.md5(combined.encode("utf-8")).hexdigest()
-    
-    timeout = 60
-    if "parameter" in settings and settings["parameter"]:
-        parameter = json.loads(settings.get("parameter") or "{}")
-        timeout = parameter.get("expire") or 60
-        
+    options = load_settings(settings)
+    combined = options.catalog_key
+    timeout = options.expire
+    background = options.refresh_background or options.refresh_incremental
+    refresh_ahead = options.refresh_ahead
+    max_stale = options.max_stale
     now = time.time()
     
     cached = _cache_mcp_tools.get(combined)
     if cached is not None and now - cached["timestamp"] < timeout:
+        count_catalog_cache("hit")
+        if background and now - cached["timestamp"] >= timeout * refresh_ahead:
+            refresh_mcp_tools(combined, settings)
         if is_debug(settings):
             logger.info(f"list_mcp_tools read from cache for key: {combined}")
         return cached["data"]
 
-    async with _cache_mcp_tools_lock:
-        cached = _cache_mcp_tools.get(combined)
-        now = time.time()
-        if cached is not None and now - cached["timestamp"] < timeout:
-            if is_debug(settings):
-                logger.info(f"list_mcp_tools read from cache for key: {combined}")
-            return cached["data"]
+    if cached is not None and cached.get("snapshot") and now - cached["timestamp"] < options.snapshot_max_age:
+        # Restored from the shared snapshot: answer from it right away and let the refresh
+        # run in the background, whatever the refresh mode.
+        count_catalog_cache("snapshot")
+        refresh_mcp_tools(combined, settings)
+        if is_debug(settings):
+            logger.info(f"list_mcp_tools read from snapshot for key: {combined}")
+        return cached["data"]
 
+    if background and cached is not None and now - cached["timestamp"] < timeout + max_stale:
+        count_catalog_cache("stale")
+        refresh_mcp_tools(combined, settings)
         if is_debug(settings):
-            logger.info(f"list_mcp_tools read from remote for key: {combined}")
-            
-        result = await list_mcp_tools_native(settings)
-        _cache_mcp_tools[combined] = {"data": result, "timestamp": time.time()}
-        return result
+            logger.info(f"list_mcp_tools read stale from cache for key: {combined}")
+        return cached["data"]
 
-async def list_mcp_tools_native(settings: Mapping):
-    nacos_addr = settings.get("nacos_addr") or "127.0.0.1:8848"
-    nacos_username = settings.get("nacos_username") or ""
-    nacos_password = settings.get("nacos_password") or ""
-    nacos_namespace_id = settings.get("nacos_namespace_id") or "public"
-    mcp_name_pattern = settings.get("mcp_name_pattern") or ""
-    tool_name_pattern = settings.get("tool_name_pattern") or ""
-    
-    ai_client_config = (AIMaintainerClientConfigBuilder().server_address(nacos_addr).username(nacos_username).password(nacos_password).access_key(nacos_username).secret_key(nacos_password).build())
-    mcp_service = await NacosAIMaintainerService.create_mcp_service(ai_client_config)
-    total_count, page_num, page_available,mcp_servers = await mcp_service.list_mcp_servers(nacos_namespace_id,"",1,65535)
-    
-    filtered_servers = [
-        mcp_server for mcp_server in mcp_servers if (mcp_server.protocol in settings.get("__protocol__", ["mcp-sse", "mcp-streamable"])) and (not mcp_name_pattern or re.search(mcp_name_pattern, mcp_server.name))
-    ]
-    
+    count_catalog_cache("miss")
     if is_debug(settings):
+        logger.info(f"list_mcp_tools read from remote for key: {combined}")
+    return await asyncio.shield(refresh_mcp_tools(combined, settings))
+
+def refresh_mcp_tools(combined: str, settings: Mapping) -> asyncio.Task:
+    # Single-flight: callers for the same key share one in-flight refresh.
+    task = _refresh_mcp_tools.get(combined)
+    if task is None or task.done():
+        count_catalog_cache("refresh")
+        task = asyncio.get_running_loop().create_task(_refresh_mcp_tools_task(combined, settings))
+        _refresh_mcp_tools[combined] = task
+    return task
+
+async def _refresh_mcp_tools_task(combined: str, settings: Mapping):
+    options = load_settings(settings)
+    cached = _cache_mcp_tools.get(combined)
+    now = time.time()
+    # Incremental refreshes update the cached catalog in place; a full one replaces it
+    # every full_refresh seconds to also pick up changes the server list does not show.
+    previous = None
+    if options.refresh_incremental and cached is not None and not cached.get("snapshot") and now - cached.get("full_at", 0) < options.full_refresh:
+        previous = cached["data"]
+    try:
+        catalog = await list_mcp_tools_native(settings, previous)
+    except Exception as e:
+        count_catalog_cache("refresh_failed")
+        cached = _cache_mcp_tools.get(combined)
+        if cached is None:
+            raise
+        logger.warning(f"list_mcp_tools refresh failed for key: {combined}, serving last good catalog: {e}")
+        return cached["data"]
+    entry = {"data": catalog, "timestamp": time.time(), "full_at": cached["full_at"] if previous is not None else now}
+    if options.snapshot in ("storage", "file"):
+        # Encoded here, off the request greenlets, and reused while the catalog is unchanged.
+        if cached is not None and cached.get("encoded") is not None and cached.get("encoded_etag") == catalog.etag:
+            entry["encoded"], entry["encoded_etag"] = cached["encoded"], cached["encoded_etag"]
+        else:
+            try:
+                entry["encoded"] = await asyncio.get_running_loop().run_in_executor(None, encode_snapshot, catalog)
+                entry["encoded_etag"] = catalog.etag
+            except Exception as e:
+                logger.warning(f"catalog snapshot for key {combined} could not be encoded: {e}")
+    _cache_mcp_tools[combined] = entry
+    return catalog
+
+async def list_mcp_tools_native(settings: Mapping, previous: ToolCatalog = None) -> ToolCatalog:
+    # With a previous catalog only servers that are new, changed (by server_marker) or
+    # failed last time are fetched again, and the result is applied to it in place.
+    options = load_settings(settings)
+    nacos_namespace_id = options.nacos_namespace_id
+    discovery = options.discovery_options
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + discovery["refresh_deadline"]
+    errors = {}
+    
+    mcp_service = await get_mcp_service(options.nacos_addr, nacos_namespace_id, options.nacos_username, options.nacos_password)
+    
+    if options.debug:
         logger.info(f"list tools call get_mcp_server_detail for all namespace [{nacos_namespace_id}]")
     
-    mcp_server_list = await asyncio.gather(*[
-        mcp_service.get_mcp_server_detail(nacos_namespace_id, mcp_server.name, "") for mcp_server in filtered_servers
-    ])
+    detail_limit = asyncio.Semaphore(discovery["detail_concurrency"])
+    
+    async def get_detail(mcp_server):
+        async with detail_limit:
+            with timed("get_mcp_server_detail", options.nacos_addr):
+                return await mcp_service.get_mcp_server_detail(nacos_namespace_id, mcp_server.name, "")
+    
+    # With paging enabled, detail lookups for a page start while later pages are still loading.
+    detail_tasks = {}
+    markers = {}
+    try:
+        async for mcp_servers in list_mcp_server_pages(mcp_service, nacos_namespace_id, discovery["page_size"], deadline, options.nacos_addr):
+            for mcp_server in mcp_servers:
+                if mcp_server.name in markers:
+                    continue
+                if (mcp_server.protocol in settings.get("__protocol__", ["mcp-sse", "mcp-streamable"])) and options.matches_server(mcp_server.name):
+                    markers[mcp_server.name] = server_marker(mcp_server)
+                    if previous is not None and previous.markers.get(mcp_server.name) == markers[mcp_server.name] and mcp_server.name not in previous.errors:
+                        continue
+                    detail_tasks[mcp_server.name] = loop.create_task(get_detail(mcp_server))
+    except BaseException:
+        for task in detail_tasks.values():
+            task.cancel()
+        raise
+    
+    details = await _gather_until(deadline, detail_tasks)
+    mcp_server_list = []
+    for name, (detail, error) in details.items():
+        if error is not None:
+            errors[name] = f"detail: {error}"
+        else:
+            mcp_server_list.append(detail)
         
     with_tools_mcp_server = []
     without_tools_mcp_server = []
@@ -168,92 +392,174 @@ async def list_mcp_tools_native(settings: Mapping):
         else:
             without_tools_mcp_server.append(mcp_server)
     
-    for mcp_server in with_tools_mcp_server:
-        to_removes = [ tool for tool in mcp_server.toolSpec.tools if tool_name_pattern and not re.search(tool_name_pattern, tool.name)]
-        if not to_removes:
-            continue
-            
-        for remove in to_removes:
-            mcp_server.toolSpec.tools.remove(remove)
-            mcp_server.toolSpec.toolsMeta.pop(remove.name, None) 
+    if options.tool_name_pattern is not None:
+        for mcp_server in with_tools_mcp_server:
+            filter_tools(mcp_server.toolSpec, options)
     
+    probe_limit = asyncio.Semaphore(discovery["probe_concurrency"])
+    
+    async def probe(mcp_server):
+        async with probe_limit:
+            timeout = min(discovery["probe_timeout"], deadline - loop.time())
+            return await asyncio.wait_for(fetch_mcp_tools(mcp_server, settings), timeout=max(timeout, 0))
+    
+    probes = await _gather_until(deadline, {mcp_server.name: probe(mcp_server) for mcp_server in without_tools_mcp_server})
+    if probes:
+        from maintainer.ai.model.nacos_mcp_info import McpToolSpecification, McpTool
     for mcp_server in without_tools_mcp_server:
-        tools = await fetch_mcp_tools(mcp_server, settings)
+        tools, error = probes[mcp_server.name]
+        if error is not None:
+            errors[mcp_server.name] = f"probe: {error}"
+            logger.warning(f"list tools probe failed for [{mcp_server.name}]: {error}")
+            continue
         if not tools or not tools.tools:
             continue
             
         mcp_server.toolSpec = McpToolSpecification(tools=[], toolsMeta={})
         for tool in tools.tools:
-            if not tool_name_pattern or re.search(tool_name_pattern, tool.name):
+            if options.matches_tool(tool.name):
                 mcp_server.toolSpec.tools.append(McpTool(name=tool.name, description=tool.description, inputSchema=tool.inputSchema))
+    
+    if errors and options.debug:
+        logger.info(f"list tools partial catalog, errors: {json.dumps(errors, ensure_ascii=False)}")
         
-    return mcp_server_list
+    if previous is None:
+        return ToolCatalog(mcp_server_list, errors, markers)
+    
+    # A server whose detail could not be fetched keeps its previous entry; being listed
+    # in errors, it is fetched again on the next refresh.
+    changed = {mcp_server.name: mcp_server for mcp_server in mcp_server_list}
+    for name in previous.markers.keys() - markers.keys():
+        changed[name] = None
+    previous.apply(changed, errors, markers)
+    if options.debug:
+        logger.info(f"list tools incremental refresh: {len(detail_tasks)} fetched, {len(changed)} applied, {len(markers) - len(detail_tasks)} unchanged")
+    return previous
+
+def filter_tools(tool_spec: "McpToolSpecification", options):
+    # One pass over the tool list; the removed tools' metadata goes with them.
+    kept = [tool for tool in tool_spec.tools if options.matches_tool(tool.name)]
+    if len(kept) == len(tool_spec.tools):
+        return
+    if tool_spec.toolsMeta:
+        kept_names = {tool.name for tool in kept}
+        removed = {tool.name for tool in tool_spec.tools if tool.name not in kept_names}
+        tool_spec.toolsMeta = {name: meta for name, meta in tool_spec.toolsMeta.items() if name not in removed}
+    tool_spec.tools = kept
+
+async def _gather_until(deadline: float, coros: dict) -> dict:
+    # Runs coros concurrently and returns {key: (result, error)}; whatever is still
+    # running at the deadline is cancelled and reported as timed out.
+    if not coros:
+        return {}
+    
+    loop = asyncio.get_running_loop()
+    tasks = {key: asyncio.ensure_future(coro) for key, coro in coros.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(deadline - loop.time(), 0))
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    
+    results = {}
+    for key, task in tasks.items():
+        if task in pending:
+            results[key] = (None, "refresh deadline exceeded")
+        elif task.exception() is not None:
+            results[key] = (None, _describe_error(task.exception()))
+        else:
+            results[key] = (task.result(), None)
+    return results
+
+def _describe_error(e: BaseException) -> str:
+    while isinstance(e, BaseExceptionGroup) and e.exceptions:
+        e = e.exceptions[0]
+    if isinstance(e, asyncio.TimeoutError):
+        return "timed out"
+    return f"{type(e).__name__}: {e}"
 
-async def fetch_mcp_tools(mcp_server_detail_info: McpServerDetailInfo, settings: Mapping):
+async def fetch_mcp_tools(mcp_server_detail_info: "McpServerDetailInfo", settings: Mapping):
     if not mcp_server_detail_info.backendEndpoints:
         if is_debug(settings):
             logger.info(f"call tool backendEndpoints is empty.")
         return None
     
-    endpoint = random.choice(mcp_server_detail_info.backendEndpoints)
-    schema = "https" if endpoint.port == 443 else "http"
-    export_path = mcp_server_detail_info.remoteServerConfig.exportPath
-    _url = f"{schema}://{endpoint.address}:{endpoint.port}/{export_path.lstrip('/')}"
-    
-    if is_debug(settings):
-        logger.info(f"fetch tools build client [{mcp_server_detail_info.protocol}] [{_url}]")
-    
-    client_ctx = None
-    if mcp_server_detail_info.protocol == "mcp-sse":
-        client_ctx = sse_client(url=_url)
-    elif mcp_server_detail_info.protocol == "mcp-streamable":
-        client_ctx = streamablehttp_client(url=_url)
-    else:
+    if mcp_server_detail_info.protocol not in ("mcp-sse", "mcp-streamable"):
         return None
     
-    try:
-        async with client_ctx as values:
-            _read, _write, *rest = values 
-            async with ClientSession(_read, _write) as _session:
-                await _session.initialize()
-                result = await _session.list_tools()
-                return result
-    except* Exception as e:
-        for sub_exc in e.exceptions:
-            logger.error(f"Subtask exception: {sub_exc}", exc_info=True)
+    async def list_tools(_url: str):
+        if is_debug(settings):
+            logger.info(f"fetch tools from pooled session [{mcp_server_detail_info.protocol}] [{_url}]")
+        return await session_pool.list_tools(_url, mcp_server_detail_info.protocol, **load_settings(settings).session_pool_options)
+    
+    return await request_mcp_backend(mcp_server_detail_info, settings, list_tools)
 
-async def call_mcp_tools(mcp_server_detail_info: McpServerDetailInfo, tool_name: str, arguments: dict, settings: Mapping):
+async def call_mcp_tools(mcp_server_detail_info: "McpServerDetailInfo", tool_name: str, arguments: dict, settings: Mapping, progress_callback=None, hedge: bool = False):
     if not mcp_server_detail_info.backendEndpoints:
         if is_debug(settings):
             logger.info(f"call tool backendEndpoints is empty.")
         return None
     
-    endpoint = random.choice(mcp_server_detail_info.backendEndpoints)
-    schema = "https" if endpoint.port == 443 else "http"
-    export_path = mcp_server_detail_info.remoteServerConfig.exportPath
-    _url = f"{schema}://{endpoint.address}:{endpoint.port}/{export_path.lstrip('/')}"
-    
-    if is_debug(settings):
-        logger.info(f"call tool build client [{mcp_server_detail_info.protocol}] [{_url}]")
-    
-    client_ctx = None
-    if mcp_server_detail_info.protocol == "mcp-sse":
-        client_ctx = sse_client(url=_url)
-    elif mcp_server_detail_info.protocol == "mcp-streamable":
-        client_ctx = streamablehttp_client(url=_url)
-    else:
+    if mcp_server_detail_info.protocol not in ("mcp-sse", "mcp-streamable"):
         raise ValueError(f"Unsupported protocol: {mcp_server_detail_info.protocol}")
     
     if is_debug(settings):
         logger.info(f"call tool param [{tool_name}] [{json.dumps(arguments, ensure_ascii=False)}]")
     
+    async def call_tool(_url: str):
+        if is_debug(settings):
+            logger.info(f"call tool from pooled session [{mcp_server_detail_info.protocol}] [{_url}]")
+        return await session_pool.call_tool(_url, mcp_server_detail_info.protocol, tool_name, arguments, progress_callback=progress_callback, **load_settings(settings).session_pool_options)
+    
+    latency_key = mcp_server_detail_info.name + "/" + tool_name
+    delay = hedge_delay(load_settings(settings), latency_key) if hedge else None
+    started = time.monotonic()
     try:
-        async with client_ctx as values:
-            _read, _write, *rest = values 
-            async with ClientSession(_read, _write) as _session:
-                await _session.initialize()
-                result = await _session.call_tool(tool_name, arguments)
-                return result
+        result = await request_mcp_backend(mcp_server_detail_info, settings, call_tool, hedge_delay=delay)
+        latency_window.record(latency_key, time.monotonic() - started)
+        return result
     except* Exception as e:
         for sub_exc in e.exceptions:
             logger.error(f"Subtask exception: {sub_exc}", exc_info=True)
+
+async def request_mcp_backend(mcp_server_detail_info: "McpServerDetailInfo", settings: Mapping, request, hedge_delay: Optional[float] = None, tried: Optional[set] = None):
+    tried = set() if tried is None else tried
+    if hedge_delay is not None and len(mcp_server_detail_info.backendEndpoints or []) > 1:
+        return await _hedged_request(mcp_server_detail_info, settings, request, hedge_delay, tried)
+    
+    from mcp.shared.exceptions import McpError
+    options = load_settings(settings).balancer_options
+    while True:
+        _url = pick_endpoint(mcp_server_detail_info, options["picker"], exclude=tried)
+        tried.add(_url)
+        try:
+            with EndpointTracker(_url, options["eject_after"], options["eject_cooloff"], answered=(McpError,)):
+                return await request(_url)
+        except SessionConnectError as e:
+            # Nothing reached the backend yet, so one retry on another endpoint is safe.
+            if len(tried) > 1 or len(tried) >= len(mcp_server_detail_info.backendEndpoints):
+                raise
+            logger.warning(f"{e}, retrying on another endpoint of [{mcp_server_detail_info.name}]")
+
+async def _hedged_request(mcp_server_detail_info: "McpServerDetailInfo", settings: Mapping, request, delay: float, tried: set):
+    # An idempotent call that has not answered after delay is sent once more to another
+    # endpoint; whichever attempt answers first wins and the other one is cancelled.
+    primary = asyncio.ensure_future(request_mcp_backend(mcp_server_detail_info, settings, request, tried=tried))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done and len(tried) < len(mcp_server_detail_info.backendEndpoints):
+            if is_debug(settings):
+                logger.info(f"hedging call to [{mcp_server_detail_info.name}] after {delay:.3f}s")
+            pending.add(asyncio.ensure_future(request_mcp_backend(mcp_server_detail_info, settings, request, tried=tried)))
+        
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+    finally:
+        for attempt in pending:
+            attempt.cancel()
@@ -1,13 +1,14 @@
+import json
+import time
+import uuid
 from typing import Mapping
 
-import asyncio
-from typing import Mapping, cast, Any
-from maintainer.ai.nacos_mcp_service import NacosAIMaintainerService
-from maintainer.common.ai_maintainer_client_config_builder import AIMaintainerClientConfigBuilder
-
 from dify_plugin import Endpoint
 from werkzeug import Request, Response
 from .auth import validate_bearer_token
+from .invoker import get_catalog_etag
+from .plugin_settings import load_settings
+from .sse import create_sse_message
 
 class McpGetEndpoint(Endpoint):
     def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
@@ -15,13 +16,35 @@ class McpGetEndpoint(Endpoint):
         if auth_error:
             return auth_error
             
-        response = {
-            "jsonrpc": "2.0",
-            "id": None,
-            "error": {
-                "code": -32000,
-                "message": "Not support make use of Server-Sent Events (SSE) to stream multiple server messages."
-            },
-        }
-
-        return Response(response, status=405, content_type="application/json")
+        if not load_settings(settings).stream:
+            response = {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {
+                    "code": -32000,
+                    "message": "Not support make use of Server-Sent Events (SSE) to stream multiple server messages."
+                },
+            }
+            return Response(json.dumps(response), status=405, content_type="application/json")
+        
+        session_id = r.headers.get("mcp-session-id") or r.args.get("session_id") or str(uuid.uuid4()).replace("-", "")
+        settings["__protocol__"] = ["mcp-sse", "mcp-streamable"]
+        
+        def generate():
+            # Server-to-client stream. The only server-initiated message is a
+            # tools/list_changed notification, sent when the merged catalog changes; in
+            # between, keepalive comments. Ends after sse_idle_timeout without one.
+            options = load_settings(settings).queue_options
+            etag = get_catalog_etag(settings)
+            last_message = time.monotonic()
+            while time.monotonic() - last_message < options["idle_timeout"]:
+                time.sleep(options["keepalive"])
+                current = get_catalog_etag(settings)
+                if etag is not None and current is not None and current != etag:
+                    last_message = time.monotonic()
+                    yield create_sse_message("message", {"jsonrpc": "2.0", "method": "notifications/tools/list_changed"})
+                else:
+                    yield ": keepalive\n\n"
+                etag = current or etag
+                
+        return Response(generate(), status=200, content_type="text/event-stream", headers={"mcp-session-id": session_id})
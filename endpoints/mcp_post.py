@@ -1,14 +1,17 @@
 import json
+import gzip
 import uuid
 import time
-import asyncio
 from typing import Mapping
 from werkzeug import Request, Response
 
 from .auth import validate_bearer_token
-from .invoker import _invoke0, is_debug
+from .invoker import is_debug, invoke_messages, unpack_messages, encode_response, encode_responses, stream_message
+from .message_queue import KEEPALIVE
+from .plugin_settings import load_settings
+from .call_policy import REQUEST_BUDGET
+from .warmup import start_warmup
 from dify_plugin import Endpoint
-from concurrent.futures import ThreadPoolExecutor
 
 import logging
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -17,20 +20,6 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
-executor = ThreadPoolExecutor(max_workers=10)
-
-def run_async_in_thread(coro_func, *args, **kwargs):
-    def thread_target():
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            return new_loop.run_until_complete(coro_func(*args, **kwargs))
-        finally:
-            new_loop.close()
-                
-    future = executor.submit(thread_target)
-    return future.result()
-
 class McpPostEndpoint(Endpoint):
     def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
         if is_debug(settings):
@@ -40,7 +29,6 @@ class McpPostEndpoint(Endpoint):
             args_str = json.dumps(r.args, ensure_ascii=False, indent=2)
             logger.info(f"r.args is {args_str}")
             
-        method = r.json.get("method")
         session_id = r.args.get('session_id', str(uuid.uuid4()).replace("-", ""))
         headers = {"mcp-session-id": session_id}
         
@@ -48,26 +36,68 @@ class McpPostEndpoint(Endpoint):
         if error:
             return error
             
-        response = {"jsonrpc": "2.0", "id": r.json.get("id"), "result": {}}
+        settings["__protocol__"] = ["mcp-sse", "mcp-streamable"]
+        settings["__deadline__"] = time.monotonic() + REQUEST_BUDGET
+        start_warmup(settings, self.session.storage)
+        messages, is_batch = unpack_messages(r.json)
+        if not is_batch and messages and self._should_stream(r, messages[0], settings):
+            events = stream_message(messages[0], values, settings, keepalive=load_settings(settings).queue_options["keepalive"], storage=self.session.storage)
+            return Response(self._stream(events, settings), status=200, content_type="text/event-stream", headers=headers)
         
-        if method == "tools/list" or method == "tools/call":
-            settings["__protocol__"] = ["mcp-sse", "mcp-streamable"]
-            response = run_async_in_thread(_invoke0, r, values, settings)
-        elif method == "initialize":
-            response = {
+        responses = [response for response in invoke_messages(messages, values, settings, lambda message: self._handle(message, settings), self.session.storage) if response is not None]
+        if not responses:
+            return Response("", status=202, content_type="application/json")
+            
+        body = encode_responses(responses, is_batch)
+        if is_debug(settings):
+            logger.info(f"response is {body.decode()}")
+            
+        body = compress_body(r, body, headers, settings)
+        return Response(body, status=200, content_type="application/json", headers=headers)
+
+    def _should_stream(self, r: Request, message, settings: Mapping) -> bool:
+        # Only tools/call can run long enough to benefit; everything else stays a plain JSON answer.
+        return (isinstance(message, dict) and message.get("method") == "tools/call" and "id" in message
+                and "text/event-stream" in r.headers.get("Accept", "") and load_settings(settings).stream)
+
+    def _stream(self, events, settings: Mapping):
+        for event in events:
+            if event is KEEPALIVE:
+                yield b": keepalive\n\n"
+                continue
+            if is_debug(settings):
+                logger.info(f"stream event is {encode_response(event).decode()}")
+            yield create_sse_event(event)
+
+    def _handle(self, message: dict, settings: Mapping):
+        if "id" not in message:
+            return None
+        if message.get("method") == "initialize":
+            return {
                 "jsonrpc": "2.0",
-                "id": r.json.get("id"),
+                "id": message.get("id"),
                 "result": {
                     "protocolVersion": "2024-11-05",
-                    "capabilities": { "tools": {} },
+                    # list_changed is only sent over the GET stream, which "stream": "off" disables.
+                    "capabilities": { "tools": {"listChanged": load_settings(settings).stream} },
                     "serverInfo": { "name": "Nacos MCP Dify Plugin", "version": "1.0.0" }
                 }
             }
-        elif method == "notifications/initialized":
-            return Response("", status=202, content_type="application/json")
-            
-        if is_debug(settings):
-            response_str = json.dumps(response, ensure_ascii=False, indent=2)
-            logger.info(f"response is {response_str}")
-            
-        return Response(json.dumps(response, ensure_ascii=False, indent=2), status=200, content_type="application/json", headers=headers)
+        return {"jsonrpc": "2.0", "id": message.get("id"), "result": {}}
+
+def compress_body(r: Request, body: bytes, headers: dict, settings: Mapping) -> bytes:
+    # Large JSON answers (tools/list above all) are gzipped for clients that accept it;
+    # small ones are not worth the CPU. Streamed responses are left alone.
+    options = load_settings(settings)
+    if not options.gzip:
+        return body
+    # Negotiated on Accept-Encoding whichever way it went, so caches keep the variants apart.
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) < options.gzip_min_size or not r.accept_encodings["gzip"]:
+        return body
+    headers["Content-Encoding"] = "gzip"
+    return gzip.compress(body, options.gzip_level)
+
+def create_sse_event(message: dict | bytes) -> bytes:
+    # Compact JSON has no raw newlines, so the whole message fits one data line.
+    return b"event: message\ndata: " + encode_response(message) + b"\n\n"
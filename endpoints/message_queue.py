@@ -0,0 +1,126 @@
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Iterator, Optional
+
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_KEEPALIVE = 15
+DEFAULT_IDLE_TIMEOUT = 600
+# How long a post from another process waits for the previous one to be picked up.
+REMOTE_PUSH_TIMEOUT = 2 * DEFAULT_POLL_INTERVAL
+REMOTE_PUSH_RETRY = 0.1
+# JSON-RPC implementation-defined server error answered for a post to an unknown session.
+SESSION_NOT_FOUND = -32002
+
+KEEPALIVE = object()
+
+class _Stream:
+    # One open stream of a session. Posts handled in this process go straight into its
+    # in-memory queue. Posts handled by another process (another worker, a serverless
+    # instance) find the stream through its storage marker and leave the message in its
+    # single-message inbox, which the stream polls every poll_interval. Its storage keys
+    # carry its own token, so a stream that replaces it under the same session id (a
+    # reconnecting client) never shares or loses keys to it.
+    def __init__(self, session_id: str):
+        self.token = uuid.uuid4().hex
+        self.marker_key = f"{session_id}:stream"
+        self.inbox_key = f"{session_id}:{self.token}:inbox"
+        self.messages: deque[bytes] = deque()
+        self.wakeup = threading.Event()
+        self.closed = False
+
+_streams: dict[str, _Stream] = {}
+_registry_lock = threading.Lock()
+
+def _current(session_id: str) -> Optional[_Stream]:
+    with _registry_lock:
+        return _streams.get(session_id)
+
+def _remote_inbox(storage, session_id: str) -> Optional[str]:
+    marker_key = f"{session_id}:stream"
+    if not storage.exist(marker_key):
+        return None
+    return f"{session_id}:{storage.get(marker_key).decode()}:inbox"
+
+def has_session(storage, session_id: str) -> bool:
+    # Checked before a post is dispatched, so a call for a session that is gone never runs.
+    stream = _current(session_id)
+    if stream is not None:
+        return not stream.closed
+    return storage.exist(f"{session_id}:stream")
+
+def push_message(storage, session_id: str, message: str | bytes) -> bool:
+    message = message if isinstance(message, bytes) else message.encode()
+    stream = _current(session_id)
+    if stream is not None:
+        if stream.closed:
+            return False
+        stream.messages.append(message)
+        stream.wakeup.set()
+        return True
+
+    inbox_key = _remote_inbox(storage, session_id)
+    if inbox_key is None:
+        return False
+    # The inbox holds one message: wait for the stream to pick up the previous one
+    # rather than overwrite it.
+    deadline = time.monotonic() + REMOTE_PUSH_TIMEOUT
+    while storage.exist(inbox_key):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(REMOTE_PUSH_RETRY)
+    storage.set(inbox_key, message)
+    return True
+
+def stream_messages(storage, session_id: str, poll_interval: float = DEFAULT_POLL_INTERVAL, keepalive: float = DEFAULT_KEEPALIVE, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> Iterator:
+    # The queue is opened eagerly so that messages posted right after the client
+    # learns its endpoint are accepted even before the stream is iterated. A stream
+    # already open for the session (the client reconnected) is ended; new posts go here.
+    stream = _Stream(session_id)
+    storage.set(stream.marker_key, stream.token.encode())
+    with _registry_lock:
+        previous = _streams.get(session_id)
+        _streams[session_id] = stream
+    if previous is not None:
+        previous.closed = True
+        previous.wakeup.set()
+    return _drain(storage, session_id, stream, poll_interval, keepalive, idle_timeout)
+
+def _drain(storage, session_id: str, stream: _Stream, poll_interval: float, keepalive: float, idle_timeout: float) -> Iterator:
+    last_message = last_sent = last_poll = time.monotonic()
+    try:
+        while True:
+            stream.wakeup.clear()
+            now = time.monotonic()
+            if now - last_poll >= poll_interval:
+                last_poll = now
+                if storage.exist(stream.inbox_key):
+                    stream.messages.append(storage.get(stream.inbox_key))
+                    storage.delete(stream.inbox_key)
+
+            while stream.messages:
+                message = stream.messages.popleft()
+                if message:
+                    last_message = last_sent = time.monotonic()
+                    yield message.decode()
+
+            if stream.closed:
+                return
+            now = time.monotonic()
+            if now - last_message >= idle_timeout:
+                return
+            if now - last_sent >= keepalive:
+                last_sent = now
+                yield KEEPALIVE
+
+            stream.wakeup.wait(max(0, min(poll_interval - (now - last_poll), keepalive - (now - last_sent), idle_timeout - (now - last_message))))
+    finally:
+        stream.closed = True
+        with _registry_lock:
+            if _streams.get(session_id) is stream:
+                del _streams[session_id]
+        # Only the keys this stream still owns: a replacement may have taken the marker.
+        if storage.exist(stream.marker_key) and storage.get(stream.marker_key) == stream.token.encode():
+            storage.delete(stream.marker_key)
+        storage.delete(stream.inbox_key)
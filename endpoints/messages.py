@@ -1,14 +1,15 @@
 import json
 import uuid
 import time
-import asyncio
 from typing import Mapping
 from werkzeug import Request, Response
 
 from .auth import validate_bearer_token
-from .invoker import _invoke0, is_debug
+from .invoker import is_debug, invoke_messages, unpack_messages, encode_responses
+from .message_queue import has_session, push_message, SESSION_NOT_FOUND
+from .call_policy import REQUEST_BUDGET
+from .warmup import start_warmup
 from dify_plugin import Endpoint
-from concurrent.futures import ThreadPoolExecutor
 
 import logging
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -17,19 +18,13 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
-executor = ThreadPoolExecutor(max_workers=10)
-
-def run_async_in_thread(coro_func, *args, **kwargs):
-    def thread_target():
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            return new_loop.run_until_complete(coro_func(*args, **kwargs))
-        finally:
-            new_loop.close()
-                
-    future = executor.submit(thread_target)
-    return future.result()
+def session_not_found(session_id: str, messages: list, is_batch: bool) -> Response:
+    error_response = {
+        "jsonrpc": "2.0",
+        "id": messages[0].get("id") if messages and not is_batch else None,
+        "error": {"code": SESSION_NOT_FOUND, "message": f"Could not find session {session_id}"},
+    }
+    return Response(json.dumps(error_response), status=404, content_type="application/json")
 
 class MessageEndpoint(Endpoint):
 
@@ -42,33 +37,43 @@ class MessageEndpoint(Endpoint):
             logger.info(f"r.args is {args_str}")
             
         session_id = r.args.get('session_id', str(uuid.uuid4()).replace("-", ""))
-        method = r.json.get("method")
         
         error = validate_bearer_token(r, settings)
         if error:
             return error
         
-        response = {"jsonrpc": "2.0", "id": r.json.get("id"), "result": {}}
+        messages, is_batch = unpack_messages(r.json)
+        # Checked before dispatch: a tools/call for a session that is gone must not run.
+        if not has_session(self.session.storage, session_id):
+            return session_not_found(session_id, messages, is_batch)
+        
+        settings["__protocol__"] = ["mcp-sse", "mcp-streamable"]
+        settings["__deadline__"] = time.monotonic() + REQUEST_BUDGET
+        start_warmup(settings, self.session.storage)
+        responses = [response for response in invoke_messages(messages, values, settings, self._handle, self.session.storage) if response is not None]
+        if not responses:
+            return Response("", status=202, content_type="application/json")
+        
+        body = encode_responses(responses, is_batch)
+        if is_debug(settings):
+            logger.info(f"response is {body.decode()}")
             
-        if method == "tools/list" or method == "tools/call":
-            settings["__protocol__"] = ["mcp-sse", "mcp-streamable"]
-            response = run_async_in_thread(_invoke0, r, values, settings)
-        elif method == "initialize":
-            response = {
+        if not push_message(self.session.storage, session_id, body):
+            # The stream ended while the messages were being handled.
+            return session_not_found(session_id, messages, is_batch)
+        return Response("", status=202, content_type="application/json")
+
+    def _handle(self, message: dict):
+        if "id" not in message:
+            return None
+        if message.get("method") == "initialize":
+            return {
                 "jsonrpc": "2.0",
-                "id": r.json.get("id"),
+                "id": message.get("id"),
                 "result": {
                     "protocolVersion": "2024-11-05",
                     "capabilities": { "experimental": {}, "prompts": {"listChanged": False}, "resources": {"subscribe": False, "listChanged": False}, "tools": {"listChanged": False}},
                     "serverInfo": { "name": "Nacos MCP Dify Plugin", "version": "1.0.0" }
                 }
             }
-        elif method == "notifications/initialized":
-            return Response("", status=202, content_type="application/json")
-        
-        if is_debug(settings):
-            response_str = json.dumps(response, ensure_ascii=False, indent=2)
-            logger.info(f"response is {response_str}")
-            
-        self.session.storage.set(session_id, json.dumps(response).encode())
-        return Response("", status=202, content_type="application/json")
+        return {"jsonrpc": "2.0", "id": message.get("id"), "result": {}}
@@ -0,0 +1,40 @@
+import time
+from typing import Mapping
+
+from dify_plugin import Endpoint
+from werkzeug import Request, Response
+from .auth import validate_bearer_token
+from .telemetry import render
+from .event_loop import background_loop
+from .balancer import _stats
+from .session_pool import session_pool
+from .result_cache import result_cache
+from .admission import admission
+from .invoker import _cache_mcp_tools
+
+class MetricsEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        auth_error = validate_bearer_token(r, settings)
+        if auth_error:
+            return auth_error
+
+        now = time.monotonic()
+        endpoints = list(_stats.items())
+        gauges = {
+            "nacos_mcp_loop_running": ("Requests running on the shared event loop.", [({}, background_loop.running)]),
+            "nacos_mcp_loop_waiting": ("Requests queued for a slot on the shared event loop.", [({}, background_loop.waiting)]),
+            "nacos_mcp_endpoint_in_flight": ("Requests in flight per MCP backend endpoint.", [({"backend": url}, stats.in_flight) for url, stats in endpoints]),
+            "nacos_mcp_endpoint_latency_ewma_seconds": ("Smoothed latency per MCP backend endpoint.", [({"backend": url}, stats.ewma_latency) for url, stats in endpoints]),
+            "nacos_mcp_endpoint_ejected": ("1 while an MCP backend endpoint is ejected.", [({"backend": url}, int(stats.is_ejected(now))) for url, stats in endpoints]),
+            "nacos_mcp_sessions": ("Pooled MCP sessions per backend endpoint.", [({"backend": url, "protocol": protocol}, len(sessions)) for (protocol, url), sessions in list(session_pool._sessions.items())]),
+            "nacos_mcp_catalog_tools": ("Tools in each cached catalog.", [({"catalog": key}, len(cached["data"])) for key, cached in list(_cache_mcp_tools.items())]),
+            "nacos_mcp_catalog_age_seconds": ("Age of each cached catalog.", [({"catalog": key}, time.time() - cached["timestamp"]) for key, cached in list(_cache_mcp_tools.items())]),
+            "nacos_mcp_result_cache_entries": ("Entries in the tools/call result cache.", [({}, len(result_cache))]),
+            "nacos_mcp_admission_running": ("tools/call requests holding an admission slot.", [({}, admission.running)]),
+            "nacos_mcp_admission_waiting": ("tools/call requests queued for an admission slot.", [({}, admission.waiting)]),
+        }
+        counters = {
+            "nacos_mcp_result_cache_total": ("tools/call result cache lookups.", [({"result": "hit"}, result_cache.hits), ({"result": "miss"}, result_cache.misses)]),
+            "nacos_mcp_admission_rejected_total": ("tools/call requests shed as server busy.", [({}, admission.rejected)]),
+        }
+        return Response(render(gauges, counters), status=200, content_type="text/plain; version=0.0.4; charset=utf-8")
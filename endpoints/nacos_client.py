@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING, AsyncIterator
+
+from .telemetry import timed
+
+if TYPE_CHECKING:
+    from maintainer.ai.model.nacos_mcp_info import McpServerBasicInfo
+
+UNPAGED_PAGE_SIZE = 65535
+
+# The maintainer SDK brings aiohttp along; it is imported by the first discovery (see
+# _service_class), and tests may set it beforehand.
+NacosAIMaintainerService = None
+
+# Maintainer services hold the SDK's auth token and a log handler each, so they are
+# created once per Nacos address, namespace and credentials and reused by every refresh.
+_mcp_services: dict[str, "NacosAIMaintainerService"] = {}
+_mcp_services_lock = None
+
+def _service_key(nacos_addr: str, nacos_namespace_id: str, nacos_username: str, nacos_password: str) -> str:
+    combined = f"{nacos_addr}|{nacos_namespace_id}|{nacos_username}|{nacos_password}"
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()
+
+def _service_class():
+    global NacosAIMaintainerService
+    if NacosAIMaintainerService is None:
+        from maintainer.ai.nacos_mcp_service import NacosAIMaintainerService as service_class
+        NacosAIMaintainerService = service_class
+    return NacosAIMaintainerService
+
+async def get_mcp_service(nacos_addr: str, nacos_namespace_id: str, nacos_username: str, nacos_password: str) -> "NacosAIMaintainerService":
+    global _mcp_services_lock
+    key = _service_key(nacos_addr, nacos_namespace_id, nacos_username, nacos_password)
+    mcp_service = _mcp_services.get(key)
+    if mcp_service is not None:
+        return mcp_service
+
+    if _mcp_services_lock is None:
+        _mcp_services_lock = asyncio.Lock()
+    async with _mcp_services_lock:
+        mcp_service = _mcp_services.get(key)
+        if mcp_service is None:
+            from maintainer.common.ai_maintainer_client_config_builder import AIMaintainerClientConfigBuilder
+            ai_client_config = (AIMaintainerClientConfigBuilder().server_address(nacos_addr).username(nacos_username).password(nacos_password).access_key(nacos_username).secret_key(nacos_password).build())
+            mcp_service = await _service_class().create_mcp_service(ai_client_config)
+            _mcp_services[key] = mcp_service
+        return mcp_service
+
+async def list_mcp_server_pages(mcp_service: "NacosAIMaintainerService", nacos_namespace_id: str, page_size: int, deadline: float, nacos_addr: str = "") -> AsyncIterator[list["McpServerBasicInfo"]]:
+    loop = asyncio.get_running_loop()
+    page_no = 1
+    while True:
+        with timed("list_mcp_servers", nacos_addr):
+            total_count, page_num, page_available, mcp_servers = await asyncio.wait_for(
+                mcp_service.list_mcp_servers(nacos_namespace_id, "", page_no, page_size),
+                timeout=max(deadline - loop.time(), 0),
+            )
+        if mcp_servers:
+            yield mcp_servers
+        if not mcp_servers or page_no >= (page_available or 1):
+            return
+        page_no += 1
@@ -0,0 +1,163 @@
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Mapping, Optional
+
+from .event_loop import DEFAULT_MAX_CONCURRENCY
+from .session_pool import DEFAULT_MAX_SESSIONS, DEFAULT_IDLE_TIMEOUT
+from .balancer import DEFAULT_EJECT_AFTER, DEFAULT_EJECT_COOLOFF
+from .result_cache import DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+from .nacos_client import UNPAGED_PAGE_SIZE
+from . import message_queue
+from .catalog_snapshot import DEFAULT_SNAPSHOT_MAX_AGE, DEFAULT_SNAPSHOT_INTERVAL
+from . import admission
+from .call_policy import DEFAULT_HEDGE_QUANTILE
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+MAX_CACHED_SETTINGS = 64
+
+# Compiled settings are kept per installation (keyed by a fingerprint of the settings)
+# and attached to the request's settings dict, so each request parses them at most once.
+_compiled: OrderedDict[str, "PluginSettings"] = OrderedDict()
+_compiled_lock = threading.Lock()
+_ATTACHED_KEY = "__settings__"
+
+def _option(parameter: Mapping, key: str, default, kind=float, label: Optional[str] = None):
+    # One bad optional value only falls back to its default; it must not fail every request.
+    value = parameter.get(key)
+    if not value:
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        logger.warning(f"ignoring invalid {label or key}={value!r} in the parameter setting, using {default}")
+        return default
+
+def _options_map(parameter: Mapping, key: str, kind=float) -> dict:
+    # A per-tool map such as call_timeouts; invalid entries are dropped one by one.
+    values = parameter.get(key) or {}
+    if not isinstance(values, Mapping):
+        logger.warning(f"ignoring invalid {key}={values!r} in the parameter setting, expected an object")
+        return {}
+    parsed = {name: _option(values, name, None, kind, f"{key}.{name}") for name in values}
+    return {name: value for name, value in parsed.items() if value is not None}
+
+def _compile_pattern(pattern: str) -> Optional[re.Pattern]:
+    return re.compile(pattern) if pattern else None
+
+class PluginSettings:
+    def __init__(self, settings: Mapping, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.nacos_addr = settings.get("nacos_addr") or "127.0.0.1:8848"
+        self.nacos_username = settings.get("nacos_username") or ""
+        self.nacos_password = settings.get("nacos_password") or ""
+        self.nacos_namespace_id = settings.get("nacos_namespace_id") or "public"
+        self.mcp_name_pattern = _compile_pattern(settings.get("mcp_name_pattern") or "")
+        self.tool_name_pattern = _compile_pattern(settings.get("tool_name_pattern") or "")
+
+        combined = f"{self.nacos_addr}|{self.nacos_namespace_id}|{settings.get('mcp_name_pattern') or ''}|{settings.get('tool_name_pattern') or ''}"
+        self.catalog_key = hashlib.md5(combined.encode("utf-8")).hexdigest()
+
+        parameter = json.loads(settings.get("parameter") or "{}")
+        self.parameter = parameter
+        self.debug = parameter.get("debug") == "debug"
+
+        self.expire = _option(parameter, "expire", 60)
+        self.refresh_background = parameter.get("refresh") == "background"
+        self.refresh_incremental = parameter.get("refresh") == "incremental"
+        self.full_refresh = _option(parameter, "full_refresh", 600, float)
+        self.refresh_ahead = _option(parameter, "refresh_ahead", 0.8, float)
+        self.max_stale = _option(parameter, "max_stale", 300, float)
+
+        self.session_pool_options = {
+            "max_sessions": _option(parameter, "session_pool_size", DEFAULT_MAX_SESSIONS, int),
+            "idle_timeout": _option(parameter, "session_idle_timeout", DEFAULT_IDLE_TIMEOUT, float),
+        }
+        self.discovery_options = {
+            "detail_concurrency": _option(parameter, "detail_concurrency", 16, int),
+            "probe_concurrency": _option(parameter, "probe_concurrency", 8, int),
+            "probe_timeout": _option(parameter, "probe_timeout", 10, float),
+            "refresh_deadline": _option(parameter, "refresh_deadline", 30, float),
+            "page_size": _option(parameter, "page_size", UNPAGED_PAGE_SIZE, int),
+        }
+        self.balancer_options = {
+            "picker": parameter.get("load_balancer") or "p2c",
+            "eject_after": _option(parameter, "eject_after", DEFAULT_EJECT_AFTER, int),
+            "eject_cooloff": _option(parameter, "eject_cooloff", DEFAULT_EJECT_COOLOFF, float),
+        }
+        self.queue_options = {
+            "poll_interval": _option(parameter, "sse_poll_interval", message_queue.DEFAULT_POLL_INTERVAL, float),
+            "keepalive": _option(parameter, "sse_keepalive", message_queue.DEFAULT_KEEPALIVE, float),
+            "idle_timeout": _option(parameter, "sse_idle_timeout", message_queue.DEFAULT_IDLE_TIMEOUT, float),
+        }
+        self.call_timeout = _option(parameter, "call_timeout", None, float)
+        self.call_timeouts = _options_map(parameter, "call_timeouts", float)
+        self.idempotent_tools = set(parameter.get("idempotent_tools") or [])
+        self.hedge = parameter.get("hedge") == "on"
+        self.hedge_delay = _option(parameter, "hedge_delay", None, float)
+        self.hedge_quantile = _option(parameter, "hedge_quantile", DEFAULT_HEDGE_QUANTILE, float)
+        self.batch_fan_out = _option(parameter, "batch_fan_out", 8, int)
+        self.max_concurrency = _option(parameter, "max_concurrency", DEFAULT_MAX_CONCURRENCY, int)
+        self.max_waiting = _option(parameter, "max_waiting", admission.DEFAULT_MAX_WAITING, int)
+        self.admission_options = {
+            "call_concurrency": _option(parameter, "call_concurrency", admission.DEFAULT_CALL_CONCURRENCY, int),
+            "backend_concurrency": _option(parameter, "backend_concurrency", admission.DEFAULT_BACKEND_CONCURRENCY, int),
+            "tool_concurrency": _option(parameter, "tool_concurrency", 0, int),
+            "queue_size": _option(parameter, "admission_queue", admission.DEFAULT_QUEUE_SIZE, int),
+            "queue_timeout": _option(parameter, "admission_timeout", admission.DEFAULT_QUEUE_TIMEOUT, float),
+        }
+        self.stream = parameter.get("stream", True) not in (False, "off")
+        self.tools_page_size = _option(parameter, "tools_page_size", 0, int)
+        self.gzip = parameter.get("gzip", True) not in (False, "off")
+        self.gzip_min_size = _option(parameter, "gzip_min_size", 1024, int)
+        self.gzip_level = _option(parameter, "gzip_level", 5, int)
+        self.cache_max_entries = _option(parameter, "cache_max_entries", DEFAULT_MAX_ENTRIES, int)
+        self.cache_ttl = _option(parameter, "cache_ttl", DEFAULT_TTL, float)
+        self.cache_tools = set(parameter.get("cache_tools") or [])
+        # Opt-in: plugin storage is also where the SSE message queues keep every response.
+        self.snapshot = parameter.get("snapshot") or ""
+        self.snapshot_dir = parameter.get("snapshot_dir") or ""
+        self.snapshot_max_age = _option(parameter, "snapshot_max_age", DEFAULT_SNAPSHOT_MAX_AGE, float)
+        self.snapshot_interval = _option(parameter, "snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL, float)
+        self.warmup = parameter.get("warmup") == "on"
+        self.warmup_sessions = _option(parameter, "warmup_sessions", 32, int)
+
+    def matches_server(self, name: str) -> bool:
+        return self.mcp_name_pattern is None or self.mcp_name_pattern.search(name) is not None
+
+    def matches_tool(self, name: str) -> bool:
+        return self.tool_name_pattern is None or self.tool_name_pattern.search(name) is not None
+
+def settings_fingerprint(settings: Mapping) -> str:
+    # Keys starting with "__" are per-request values set by the endpoints, not settings.
+    items = sorted((key, value) for key, value in settings.items() if not key.startswith("__"))
+    return hashlib.sha256(json.dumps(items, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def load_settings(settings: Mapping) -> PluginSettings:
+    attached = settings.get(_ATTACHED_KEY)
+    if attached is not None:
+        return attached
+
+    fingerprint = settings_fingerprint(settings)
+    with _compiled_lock:
+        compiled = _compiled.get(fingerprint)
+        if compiled is not None:
+            _compiled.move_to_end(fingerprint)
+    if compiled is None:
+        compiled = PluginSettings(settings, fingerprint)
+        with _compiled_lock:
+            _compiled[fingerprint] = compiled
+            while len(_compiled) > MAX_CACHED_SETTINGS:
+                _compiled.popitem(last=False)
+
+    if isinstance(settings, dict):
+        settings[_ATTACHED_KEY] = compiled
+    return compiled
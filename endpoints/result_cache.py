@@ -0,0 +1,112 @@
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+def cache_key(scope: str, server_name: str, tool_name: str, arguments: Optional[dict]) -> str:
+    canonical = json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{scope}|{server_name}|{tool_name}|{canonical}".encode("utf-8")).hexdigest()
+
+def cache_ttl(options, tools_meta, full_name: str, tool_name: str) -> float:
+    # Tools opt in through the cache_tools allowlist of the parameter setting or with
+    # invokeContext.cacheable in their Nacos toolsMeta; 0 means not cacheable.
+    if full_name in options.cache_tools:
+        return options.cache_ttl
+
+    meta = (tools_meta or {}).get(tool_name)
+    invoke_context = getattr(meta, "invokeContext", None) or {}
+    if not invoke_context.get("cacheable"):
+        return 0
+    ttl = invoke_context.get("cacheTtl")
+    if not ttl:
+        return options.cache_ttl
+    try:
+        return float(ttl)
+    except (TypeError, ValueError):
+        logger.warning(f"ignoring invalid invokeContext.cacheTtl={ttl!r} of tool {tool_name}, using {options.cache_ttl}")
+        return options.cache_ttl
+
+class ResultCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > max(1, self.max_entries):
+            self._entries.popitem(last=False)
+
+    async def get_or_call(self, key: str, ttl: float, call, cacheable=lambda value: value is not None):
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            # Identical calls that arrive while one is running wait for its result.
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                value = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leading call was cancelled (its own deadline, a client that went
+                # away); unless this caller was cancelled too, it takes over the call.
+                if inflight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved; waiters (if any) re-raise it themselves.
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if cacheable(value):
+                self.put(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+result_cache = ResultCache()
@@ -0,0 +1,256 @@
+import time
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+import anyio
+
+from .event_loop import background_loop
+from .telemetry import timed
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+DEFAULT_MAX_SESSIONS = 4
+DEFAULT_IDLE_TIMEOUT = 120
+REAP_INTERVAL = 15
+
+class SessionClosedError(Exception):
+    pass
+
+class SessionConnectError(Exception):
+    pass
+
+class PooledSession:
+    def __init__(self, url: str, protocol: str, idle_timeout: float):
+        self.url = url
+        self.protocol = protocol
+        self.idle_timeout = idle_timeout
+        self.session: Optional["ClientSession"] = None
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self._ready = None
+        self._closing = None
+        self._task = None
+
+    @property
+    def closed(self) -> bool:
+        return self._task is None or self._task.done()
+
+    def is_idle(self, now: float) -> bool:
+        return self.in_flight == 0 and now - self.last_used > self.idle_timeout
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self._closing = asyncio.Event()
+        # The transport and ClientSession are entered and exited by one holder task,
+        # because their anyio task groups must be closed by the task that opened them.
+        self._task = loop.create_task(self._hold())
+        try:
+            with timed("initialize", self.url):
+                await asyncio.shield(self._ready)
+        except asyncio.CancelledError:
+            self._ready.cancel()
+            self._task.cancel()
+            raise
+
+    async def _hold(self):
+        # mcp is imported by the first session rather than at plugin start.
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+        from mcp.client.streamable_http import streamablehttp_client
+
+        if self.protocol == "mcp-sse":
+            client_ctx = sse_client(url=self.url)
+        elif self.protocol == "mcp-streamable":
+            client_ctx = streamablehttp_client(url=self.url)
+        else:
+            self._ready.set_exception(ValueError(f"Unsupported protocol: {self.protocol}"))
+            return
+
+        try:
+            async with client_ctx as values:
+                _read, _write, *rest = values
+                async with ClientSession(_read, _write) as _session:
+                    await _session.initialize()
+                    self.session = _session
+                    self._ready.set_result(None)
+                    await self._closing.wait()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                logger.warning(f"mcp session [{self.protocol}] [{self.url}] dropped: {e}")
+        finally:
+            self.session = None
+            if not self._ready.done():
+                self._ready.set_exception(SessionClosedError(f"mcp session [{self.url}] closed during initialize"))
+
+    async def request(self, coro_func, *args, **kwargs):
+        if self.closed or self.session is None:
+            raise SessionClosedError(f"mcp session [{self.url}] is closed")
+
+        self.in_flight += 1
+        try:
+            call = asyncio.ensure_future(coro_func(self.session, *args, **kwargs))
+            try:
+                await asyncio.wait({call, self._task}, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                # Deadline or a hedged attempt that lost: the call must not outlive its caller.
+                call.cancel()
+                raise
+            if not call.done():
+                call.cancel()
+                raise SessionClosedError(f"mcp session [{self.url}] dropped during request")
+            return call.result()
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream) as e:
+            raise SessionClosedError(f"mcp session [{self.url}] transport is closed") from e
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    async def close(self):
+        if self._closing is not None:
+            self._closing.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout=5)
+            except Exception:
+                self._task.cancel()
+
+class McpSessionPool:
+    def __init__(self):
+        self._sessions: dict[tuple, list[PooledSession]] = {}
+        self._connecting: dict[tuple, int] = {}
+        # Per backend: resolved whenever one of its sessions finishes opening, for the
+        # callers that found it at its limit with nothing pooled yet.
+        self._opened: dict[tuple, asyncio.Future] = {}
+        self._reaper = None
+        self._closed = False
+
+    async def call_tool(self, url: str, protocol: str, tool_name: str, arguments: dict, max_sessions: int = DEFAULT_MAX_SESSIONS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, progress_callback=None):
+        return await background_loop.run_here(self._request(url, protocol, max_sessions, idle_timeout, lambda s: s.call_tool(tool_name, arguments, progress_callback=progress_callback), "call_tool"))
+
+    async def list_tools(self, url: str, protocol: str, max_sessions: int = DEFAULT_MAX_SESSIONS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        return await background_loop.run_here(self._request(url, protocol, max_sessions, idle_timeout, lambda s: s.list_tools(), "list_tools"))
+
+    async def warm(self, url: str, protocol: str, max_sessions: int = DEFAULT_MAX_SESSIONS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        # Opens a session ahead of the first call, unless one is pooled already.
+        await background_loop.run_here(self._warm(url, protocol, max_sessions, idle_timeout))
+
+    async def _warm(self, url: str, protocol: str, max_sessions: int, idle_timeout: float):
+        self._start_reaper()
+        await self._acquire(url, protocol, max_sessions, idle_timeout)
+
+    def _start_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.get_running_loop().create_task(self._reap())
+
+    async def _request(self, url: str, protocol: str, max_sessions: int, idle_timeout: float, coro_func, operation: str):
+        self._start_reaper()
+
+        pooled, reused = await self._acquire(url, protocol, max_sessions, idle_timeout)
+        try:
+            with timed(operation, url):
+                return await pooled.request(coro_func)
+        except SessionClosedError:
+            await self._discard(pooled)
+            if not reused or self._closed:
+                raise
+        except Exception:
+            if pooled.closed:
+                await self._discard(pooled)
+            raise
+
+        # A pooled session that was already idle may have been dropped by the backend
+        # in the meantime; retry once on a freshly opened session.
+        logger.info(f"mcp session [{protocol}] [{url}] was dropped, reconnecting")
+        pooled, _ = await self._acquire(url, protocol, max_sessions, idle_timeout, fresh=True)
+        try:
+            with timed(operation, url):
+                return await pooled.request(coro_func)
+        except SessionClosedError:
+            await self._discard(pooled)
+            raise
+
+    async def _acquire(self, url: str, protocol: str, max_sessions: int, idle_timeout: float, fresh: bool = False):
+        key = (protocol, url)
+        while True:
+            if self._closed:
+                raise SessionClosedError("mcp session pool is closed")
+
+            sessions = self._sessions.setdefault(key, [])
+            for pooled in [s for s in sessions if s.closed]:
+                sessions.remove(pooled)
+
+            connecting = self._connecting.get(key, 0)
+            if sessions and not fresh:
+                least_busy = min(sessions, key=lambda s: s.in_flight)
+                # MCP multiplexes requests over one session, so once the backend is at its
+                # limit the least busy session is shared instead of opening another one.
+                if least_busy.in_flight == 0 or len(sessions) + connecting >= max(1, max_sessions):
+                    return least_busy, True
+            if not connecting or len(sessions) + connecting < max(1, max_sessions):
+                break
+            # At the limit with sessions still opening: wait for one of them rather than
+            # opening another; any session opened meanwhile is fresh.
+            await asyncio.shield(self._opened_future(key))
+            fresh = False
+
+        pooled = PooledSession(url, protocol, idle_timeout)
+        self._connecting[key] = connecting + 1
+        try:
+            await pooled.open()
+        except Exception as e:
+            raise SessionConnectError(f"mcp session [{protocol}] [{url}] could not be opened: {e}") from e
+        else:
+            self._sessions.setdefault(key, []).append(pooled)
+        finally:
+            self._connecting[key] -= 1
+            opened = self._opened.pop(key, None)
+            if opened is not None and not opened.done():
+                opened.set_result(None)
+        return pooled, False
+
+    def _opened_future(self, key: tuple) -> asyncio.Future:
+        opened = self._opened.get(key)
+        if opened is None:
+            opened = self._opened[key] = asyncio.get_running_loop().create_future()
+        return opened
+
+    async def _discard(self, pooled: PooledSession):
+        sessions = self._sessions.get((pooled.protocol, pooled.url), [])
+        if pooled in sessions:
+            sessions.remove(pooled)
+        await pooled.close()
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            for key, sessions in list(self._sessions.items()):
+                for pooled in [s for s in sessions if s.closed or s.is_idle(now)]:
+                    sessions.remove(pooled)
+                    await pooled.close()
+                if not sessions and not self._connecting.get(key):
+                    self._sessions.pop(key, None)
+            if not self._sessions:
+                return
+
+    async def close(self):
+        await background_loop.run_here(self.close_sessions())
+
+    async def close_sessions(self):
+        self._closed = True
+        sessions = [s for group in self._sessions.values() for s in group]
+        self._sessions.clear()
+        await asyncio.gather(*[s.close() for s in sessions], return_exceptions=True)
+
+session_pool = McpSessionPool()
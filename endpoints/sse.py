@@ -1,12 +1,11 @@
 import json
-import time
 import uuid
 from .auth import validate_bearer_token
+from .message_queue import stream_messages, KEEPALIVE
+from .plugin_settings import load_settings
+from .warmup import start_warmup
 
-import asyncio
-from typing import Mapping, cast, Any
-from maintainer.ai.nacos_mcp_service import NacosAIMaintainerService
-from maintainer.common.ai_maintainer_client_config_builder import AIMaintainerClientConfigBuilder
+from typing import Mapping
 
 from dify_plugin import Endpoint
 from werkzeug import Request, Response
@@ -22,16 +21,17 @@ class SSEEndpoint(Endpoint):
         if auth_error:
             return auth_error
 
+        start_warmup(settings, self.session.storage)
+
         def generate():
+            messages = stream_messages(self.session.storage, session_id, **load_settings(settings).queue_options)
             endpoint = f"messages/?session_id={session_id}"
             yield create_sse_message("endpoint", endpoint)
 
-            while True:
-                if self.session.storage.exist(session_id):
-                    message = self.session.storage.get(session_id)
-                    message = message.decode()
-                    self.session.storage.delete(session_id)
+            for message in messages:
+                if message is KEEPALIVE:
+                    yield ": keepalive\n\n"
+                else:
                     yield create_sse_message("message", message)
-                time.sleep(0.5)
 
         return Response(generate(), status=200, content_type="text/event-stream")
@@ -0,0 +1,98 @@
+import time
+import bisect
+
+# Latency buckets in seconds, from a pooled tool call up to a slow discovery.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Every backend call and cache lookup runs on the shared loop thread, so the counters
+# are plain ints and need no locking; the metrics endpoint only reads them.
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_latency: dict[tuple[str, str], Histogram] = {}
+_errors: dict[tuple[str, str], int] = {}
+_in_flight: dict[str, int] = {}
+_catalog_cache: dict[str, int] = {}
+
+def observe(operation: str, backend: str, seconds: float):
+    histogram = _latency.get((operation, backend))
+    if histogram is None:
+        histogram = _latency[(operation, backend)] = Histogram()
+    histogram.observe(seconds)
+
+def count_catalog_cache(result: str):
+    _catalog_cache[result] = _catalog_cache.get(result, 0) + 1
+
+class timed:
+    # with timed("call_tool", url): ... records latency, errors and in-flight per operation.
+    __slots__ = ("operation", "backend", "started")
+
+    def __init__(self, operation: str, backend: str):
+        self.operation = operation
+        self.backend = backend
+
+    def __enter__(self):
+        _in_flight[self.operation] = _in_flight.get(self.operation, 0) + 1
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.operation, self.backend, time.monotonic() - self.started)
+        _in_flight[self.operation] -= 1
+        if exc_type is not None:
+            key = (self.operation, self.backend)
+            _errors[key] = _errors.get(key, 0) + 1
+        return False
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def render(gauges: dict[str, tuple[str, list]], counters: dict[str, tuple[str, list]]) -> str:
+    # Prometheus text exposition format 0.0.4. gauges and counters map a metric name to
+    # (help, [(labels, value), ...]) for values sampled by the caller at scrape time.
+    lines = [
+        "# HELP nacos_mcp_backend_request_seconds Latency of Nacos and MCP backend requests.",
+        "# TYPE nacos_mcp_backend_request_seconds histogram",
+    ]
+    for (operation, backend), histogram in list(_latency.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f"nacos_mcp_backend_request_seconds_bucket{_labels(operation=operation, backend=backend, le=bound)} {cumulative}")
+        lines.append(f"nacos_mcp_backend_request_seconds_sum{_labels(operation=operation, backend=backend)} {histogram.sum}")
+        lines.append(f"nacos_mcp_backend_request_seconds_count{_labels(operation=operation, backend=backend)} {histogram.count}")
+
+    lines.append("# HELP nacos_mcp_backend_errors_total Backend requests that raised.")
+    lines.append("# TYPE nacos_mcp_backend_errors_total counter")
+    for (operation, backend), count in list(_errors.items()):
+        lines.append(f"nacos_mcp_backend_errors_total{_labels(operation=operation, backend=backend)} {count}")
+
+    lines.append("# HELP nacos_mcp_backend_in_flight Backend requests currently running.")
+    lines.append("# TYPE nacos_mcp_backend_in_flight gauge")
+    for operation, count in list(_in_flight.items()):
+        lines.append(f"nacos_mcp_backend_in_flight{_labels(operation=operation)} {count}")
+
+    lines.append("# HELP nacos_mcp_catalog_cache_total Tool catalog cache lookups and refreshes.")
+    lines.append("# TYPE nacos_mcp_catalog_cache_total counter")
+    for result, count in list(_catalog_cache.items()):
+        lines.append(f"nacos_mcp_catalog_cache_total{_labels(result=result)} {count}")
+
+    for kind, metrics in (("counter", counters), ("gauge", gauges)):
+        for name, (help_text, samples) in metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+    return "\n".join(lines) + "\n"
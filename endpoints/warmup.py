@@ -0,0 +1,64 @@
+import time
+import asyncio
+from typing import Mapping
+
+from .event_loop import background_loop
+from .plugin_settings import load_settings
+from .session_pool import session_pool
+from .balancer import endpoint_url
+from .catalog_snapshot import snapshot_store, restore_catalog
+from .invoker import list_mcp_tools, _cache_mcp_tools
+
+import logging
+from dify_plugin.config.logger_format import plugin_logger_handler
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(plugin_logger_handler)
+
+# Catalog keys warmed by this process.
+_started: set[str] = set()
+
+def start_warmup(settings: Mapping, storage=None):
+    # With "warmup": "on", an installation's first request (usually initialize; its
+    # settings, and so the Nacos address, are unknown before) starts loading the catalog
+    # and opening backend sessions in the background, so the tools/list and tools/call
+    # that follow find them ready. Returns at once.
+    options = load_settings(settings)
+    if not options.warmup or options.catalog_key in _started:
+        return
+    _started.add(options.catalog_key)
+
+    # Plugin storage is only usable here, on the request's greenlet.
+    store = snapshot_store(options, storage)
+    if store is not None:
+        restore_catalog(store, options.catalog_key, _cache_mcp_tools, options.snapshot_max_age)
+    # Not through background_loop.submit: the warm-up must not hold a request slot.
+    asyncio.run_coroutine_threadsafe(_warm_up(dict(settings)), background_loop.loop)
+
+async def _warm_up(settings: Mapping):
+    options = load_settings(settings)
+    started = time.monotonic()
+    try:
+        catalog = await list_mcp_tools(settings)
+    except Exception as e:
+        logger.warning(f"warm-up could not load the tool catalog: {e}")
+        return
+
+    urls = {}
+    for mcp_server in catalog.servers:
+        if mcp_server.protocol not in ("mcp-sse", "mcp-streamable") or not getattr(mcp_server, "remoteServerConfig", None):
+            continue
+        for endpoint in mcp_server.backendEndpoints or []:
+            urls.setdefault(endpoint_url(mcp_server, endpoint), mcp_server.protocol)
+    urls = list(urls.items())[:options.warmup_sessions]
+
+    limit = asyncio.Semaphore(options.discovery_options["probe_concurrency"])
+
+    async def open_session(url: str, protocol: str):
+        async with limit:
+            await session_pool.warm(url, protocol, **options.session_pool_options)
+
+    results = await asyncio.gather(*[open_session(url, protocol) for url, protocol in urls], return_exceptions=True)
+    opened = sum(1 for result in results if not isinstance(result, BaseException))
+    logger.info(f"warm-up done in {time.monotonic() - started:.2f}s: {len(catalog)} tools, {opened}/{len(urls)} backend sessions")
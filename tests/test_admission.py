@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+
+from endpoints.admission import AdmissionController, ServerBusyError
+
+def limits(**overrides) -> dict:
+    values = {"call_concurrency": 4, "backend_concurrency": 2, "tool_concurrency": 0, "queue_size": 8, "queue_timeout": 5}
+    values.update(overrides)
+    return values
+
+class AdmissionTest(unittest.IsolatedAsyncioTestCase):
+    async def test_grants_within_caps(self):
+        admission = AdmissionController()
+        await admission.acquire("a", "a/t", limits())
+        await admission.acquire("a", "a/t", limits())
+        await admission.acquire("b", "b/t", limits())
+        self.assertEqual(admission.running, 3)
+        self.assertEqual(admission.waiting, 0)
+
+    async def test_waiter_is_granted_on_release(self):
+        admission = AdmissionController()
+        for _ in range(2):
+            await admission.acquire("a", "a/t", limits())
+        waiter = asyncio.ensure_future(admission.acquire("a", "a/t", limits()))
+        await asyncio.sleep(0)
+        self.assertEqual(admission.waiting, 1)
+        self.assertFalse(waiter.done())
+
+        admission.release("a", "a/t")
+        await waiter
+        self.assertEqual((admission.running, admission.waiting), (2, 0))
+
+    async def test_queue_timeout_rejects(self):
+        admission = AdmissionController()
+        await admission.acquire("a", "a/t", limits(backend_concurrency=1))
+        with self.assertRaises(ServerBusyError):
+            await admission.acquire("a", "a/t", limits(backend_concurrency=1, queue_timeout=0.05))
+        self.assertEqual((admission.running, admission.waiting, admission.rejected), (1, 0, 1))
+
+    async def test_full_queue_sheds_at_once(self):
+        admission = AdmissionController()
+        tight = limits(backend_concurrency=1, queue_size=1)
+        await admission.acquire("a", "a/t", tight)
+        queued = asyncio.ensure_future(admission.acquire("a", "a/t", tight))
+        await asyncio.sleep(0)
+        with self.assertRaises(ServerBusyError):
+            await admission.acquire("a", "a/t", tight)
+        self.assertEqual(admission.rejected, 1)
+
+        admission.release("a", "a/t")
+        await queued
+        self.assertEqual((admission.running, admission.waiting), (1, 0))
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        admission = AdmissionController()
+        await admission.acquire("a", "a/t", limits(backend_concurrency=1))
+        waiter = asyncio.ensure_future(admission.acquire("a", "a/t", limits(backend_concurrency=1)))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(admission.waiting, 0)
+        admission.release("a", "a/t")
+        self.assertEqual(admission.running, 0)
+
+    async def test_freed_slots_go_round_robin_across_servers(self):
+        admission = AdmissionController()
+        shared = limits(call_concurrency=1)
+        await admission.acquire("x", "x/t", shared)
+        granted = []
+
+        async def wait(server: str):
+            await admission.acquire(server, f"{server}/t", shared)
+            granted.append(server)
+
+        waiters = [asyncio.ensure_future(wait(server)) for server in ("a", "a", "a", "b")]
+        await asyncio.sleep(0.01)
+        holder = "x"
+        for _ in waiters:
+            admission.release(holder, f"{holder}/t")
+            await asyncio.sleep(0.01)
+            holder = granted[-1]
+        await asyncio.gather(*waiters)
+        # b does not wait behind every queued call of a.
+        self.assertEqual(granted, ["a", "b", "a", "a"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import importlib.util
+import unittest
+from types import SimpleNamespace
+
+from endpoints.invoker import request_mcp_backend
+
+SETTINGS = {"parameter": "{}"}
+
+def server(name: str, endpoints: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        name=name,
+        protocol="mcp-streamable",
+        remoteServerConfig=SimpleNamespace(exportPath="/mcp"),
+        backendEndpoints=[SimpleNamespace(address=f"{name}-{i}.invalid", port=8080) for i in range(endpoints)],
+    )
+
+@unittest.skipIf(importlib.util.find_spec("mcp") is None, "mcp is not installed")
+class HedgingTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # request_mcp_backend imports mcp on first use; keep that out of the timings.
+        import mcp.shared.exceptions  # noqa: F401
+
+    def setUp(self):
+        self.attempts = []
+        self.cancelled = []
+
+    def backend(self, *latencies: float):
+        # The n-th attempt answers after latencies[n], whichever endpoint it went to.
+        async def request(url: str):
+            latency = latencies[len(self.attempts)]
+            self.attempts.append(url)
+            try:
+                await asyncio.sleep(latency)
+            except asyncio.CancelledError:
+                self.cancelled.append(url)
+                raise
+            return url
+        return request
+
+    async def test_hedge_wins_over_a_slow_attempt(self):
+        started = asyncio.get_running_loop().time()
+        result = await request_mcp_backend(server("win", 2), SETTINGS, self.backend(2.0, 0.01), hedge_delay=0.05)
+        self.assertLess(asyncio.get_running_loop().time() - started, 1.0)
+        self.assertEqual(len(self.attempts), 2)
+        self.assertNotEqual(self.attempts[0], self.attempts[1])
+        self.assertEqual(result, self.attempts[1])
+        # The losing attempt is cancelled, not awaited; let it unwind.
+        await asyncio.sleep(0)
+        self.assertEqual(self.cancelled, [self.attempts[0]])
+
+    async def test_fast_answer_sends_no_hedge(self):
+        result = await request_mcp_backend(server("lose", 2), SETTINGS, self.backend(0.01, 0.01), hedge_delay=0.2)
+        self.assertEqual(self.attempts, [result])
+        self.assertEqual(self.cancelled, [])
+
+    async def test_primary_wins_when_the_hedge_is_slower(self):
+        result = await request_mcp_backend(server("primary", 2), SETTINGS, self.backend(0.1, 2.0), hedge_delay=0.05)
+        self.assertEqual(result, self.attempts[0])
+        await asyncio.sleep(0)
+        self.assertEqual(self.cancelled, [self.attempts[1]])
+
+    async def test_single_endpoint_is_not_hedged(self):
+        await request_mcp_backend(server("single", 1), SETTINGS, self.backend(0.1), hedge_delay=0.01)
+        self.assertEqual(len(self.attempts), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from endpoints.result_cache import ResultCache
+
+class ResultCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ResultCache()
+        self.calls = 0
+
+    async def slow_call(self, seconds: float = 0.2, value="ok"):
+        self.calls += 1
+        await asyncio.sleep(seconds)
+        return value
+
+    async def test_identical_calls_share_one_call(self):
+        results = await asyncio.gather(*[self.cache.get_or_call("k", 60, self.slow_call) for _ in range(5)])
+        self.assertEqual(results, ["ok"] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(await self.cache.get_or_call("k", 60, self.slow_call), "ok")
+        self.assertEqual(self.calls, 1)
+
+    async def test_waiter_takes_over_a_cancelled_leader(self):
+        async def leader():
+            async with asyncio.timeout(0.05):
+                return await self.cache.get_or_call("k", 60, self.slow_call)
+
+        async def waiter():
+            await asyncio.sleep(0.01)
+            async with asyncio.timeout(5):
+                return await self.cache.get_or_call("k", 60, self.slow_call)
+
+        results = await asyncio.gather(leader(), waiter(), return_exceptions=True)
+        self.assertIsInstance(results[0], TimeoutError)
+        self.assertEqual(results[1], "ok")
+        self.assertEqual(self.calls, 2)
+
+    async def test_cancelled_waiter_leaves_the_leader_running(self):
+        async def waiter():
+            await asyncio.sleep(0.01)
+            async with asyncio.timeout(0.05):
+                return await self.cache.get_or_call("k", 60, self.slow_call)
+
+        results = await asyncio.gather(self.cache.get_or_call("k", 60, self.slow_call), waiter(), return_exceptions=True)
+        self.assertEqual(results[0], "ok")
+        self.assertIsInstance(results[1], TimeoutError)
+        self.assertEqual(self.calls, 1)
+
+    async def test_errors_reach_waiters_and_are_not_cached(self):
+        async def failing():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            raise RuntimeError("backend failed")
+
+        results = await asyncio.gather(*[self.cache.get_or_call("k", 60, failing) for _ in range(3)], return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(await self.cache.get_or_call("k", 60, self.slow_call), "ok")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import importlib.util
+import unittest
+
+from endpoints.session_pool import McpSessionPool
+
+@unittest.skipIf(importlib.util.find_spec("mcp") is None, "mcp is not installed")
+class SessionPoolTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        from benchmarks.run import start_backend
+        backend_args = argparse.Namespace(tools=2, mcp_latency=0.05, mcp_jitter=0.0, mcp_fail_rate=0.0, payload=0)
+        cls.backend, port = start_backend("streamable-http", backend_args)
+        cls.url = f"http://127.0.0.1:{port}/mcp"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.backend.kill()
+
+    async def asyncSetUp(self):
+        self.pool = McpSessionPool()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+
+    def pooled(self) -> int:
+        return sum(len(sessions) for sessions in self.pool._sessions.values())
+
+    async def call(self, max_sessions: int):
+        return await self.pool.call_tool(self.url, "mcp-streamable", "tool_0", {"text": "ping"}, max_sessions=max_sessions)
+
+    async def test_concurrent_first_calls_respect_the_session_limit(self):
+        results = await asyncio.gather(*[self.call(max_sessions=4) for _ in range(30)])
+        self.assertEqual(len(results), 30)
+        self.assertFalse(any(result.isError for result in results))
+        self.assertLessEqual(self.pooled(), 4)
+
+    async def test_idle_session_is_reused(self):
+        await self.call(max_sessions=4)
+        await self.call(max_sessions=4)
+        self.assertEqual(self.pooled(), 1)
+
+    async def test_closed_pool_refuses_calls(self):
+        await self.call(max_sessions=4)
+        await self.pool.close()
+        with self.assertRaises(Exception):
+            await self.call(max_sessions=4)
+
+if __name__ == "__main__":
+    unittest.main()